@@ -0,0 +1,99 @@
+"""
+Cold-start import cost of the Lambda handler module: median wall time of
+`import app` in fresh interpreters, plus the slowest modules from a
+`python -X importtime` profile. With --baseline the same is measured for
+src/ at another git revision, for a before/after comparison.
+
+    python bench/bench_cold_start.py --runs 7 --baseline HEAD~1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+
+PROBE = (
+    "import sys, time, json; t = time.perf_counter(); import app; "
+    "print(json.dumps({'import_s': time.perf_counter() - t, 'modules': len(sys.modules), "
+    "'pandas_loaded': 'pandas' in sys.modules}))"
+)
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("S3_BUCKET", "bench-cold-start")
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def _importtime_top(src, top):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=src, env=_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Names are indented two spaces per nesting level; keep app's direct
+        # imports so nothing is counted twice.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append({
+                "module": name.strip(),
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def measure(src, runs, top):
+    # One warm-up so every variant is measured with compiled bytecode on disk.
+    subprocess.run([sys.executable, "-c", "import app"], cwd=src, env=_env(), check=True, capture_output=True)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=src, env=_env(), capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "import_s_median": round(statistics.median(s["import_s"] for s in samples), 3),
+        "import_s_min": round(min(s["import_s"] for s in samples), 3),
+        "modules": samples[-1]["modules"],
+        "pandas_loaded": samples[-1]["pandas_loaded"],
+        "slowest_imports": _importtime_top(src, top),
+    }
+
+
+def _checkout(rev, dest):
+    archive = subprocess.run(["git", "archive", rev, "src"], cwd=ROOT, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, "src")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time of app.py.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    parser.add_argument("--baseline", help="git revision to compare against, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    report = {"current": measure(os.path.join(ROOT, "src"), args.runs, args.top)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            report["baseline"] = {"rev": args.baseline, **measure(_checkout(args.baseline, tmp), args.runs, args.top)}
+        before = report["baseline"]["import_s_median"]
+        report["saved_s"] = round(before - report["current"]["import_s_median"], 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
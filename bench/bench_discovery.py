@@ -0,0 +1,121 @@
+"""
+Time S3 discovery against an in-memory 100k-key bucket: the old per-family
+lambda predicates vs classify_key, and full vs per-family listing.
+
+    python bench/bench_discovery.py --keys 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("S3_BUCKET", "bench-bucket")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import app  # noqa: E402
+
+PAGE_SIZE = 1000
+
+OLD_WANTS = {
+    "ccprov1": lambda k: os.path.basename(k).startswith("ccprov1_") and k.lower().endswith(".xlsx"),
+    "ccprov2": lambda k: os.path.basename(k).startswith("ccprov2_") and k.lower().endswith(".xlsx"),
+    "ccstaff": lambda k: os.path.basename(k).startswith("ccstaff_") and k.lower().endswith(".xlsx"),
+    "labor": lambda k: os.path.basename(k).startswith("Labor_Summary_by_Employee_Retool_Annual_Export_") and k.lower().endswith(".xlsx"),
+    "ccschedule1": lambda k: os.path.basename(k).startswith("ccschedule1_") and k.lower().endswith((".xls", ".xlsx")),
+    "ccschedule2": lambda k: os.path.basename(k).startswith("ccschedule2_") and k.lower().endswith((".xls", ".xlsx")),
+    "ccschedule3": lambda k: os.path.basename(k).startswith("ccschedule3_") and k.lower().endswith((".xls", ".xlsx")),
+}
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix=""):
+        keys = [o for o in self.client.objects if o["Key"].startswith(Prefix)]
+        for i in range(0, max(len(keys), 1), PAGE_SIZE):
+            self.client.pages += 1
+            page = keys[i:i + PAGE_SIZE]
+            yield {"KeyCount": len(page), "Contents": page}
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = sorted(objects, key=lambda o: o["Key"])
+        self.pages = 0
+
+    def get_paginator(self, name):
+        return FakePaginator(self)
+
+
+def fake_bucket(n, prefix, seed=0):
+    rnd = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    families = [p for p, _ in app.WANTS.values()]
+    objects = []
+    for i in range(n):
+        when = start + timedelta(minutes=i)
+        stamp = when.strftime("%Y%m%d%H%M")
+        r = rnd.random()
+        if r < 0.3:
+            key = f"{prefix}{rnd.choice(families)}{stamp}.{rnd.choice(['xlsx', 'XLSX', 'xls', 'csv'])}"
+        elif r < 0.6:
+            key = f"{prefix}archive/{stamp[:4]}/{rnd.choice(families)}{stamp}.xlsx"
+        else:
+            key = f"{prefix}other/report_{i}.pdf"
+        objects.append({"Key": key, "LastModified": when, "ETag": f'"{i}"'})
+    return objects
+
+
+def old_newest(objects):
+    newest = {name: None for name in OLD_WANTS}
+    for obj in objects:
+        for name, predicate in OLD_WANTS.items():
+            if predicate(obj["Key"]):
+                cur = newest[name]
+                if cur is None or obj["LastModified"] > cur["LastModified"]:
+                    newest[name] = obj
+    return newest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark S3 key discovery.")
+    parser.add_argument("--keys", type=int, default=100_000)
+    args = parser.parse_args()
+
+    prefix = "paylocity/"
+    objects = fake_bucket(args.keys, prefix)
+
+    t = time.perf_counter()
+    expected = old_newest(objects)
+    old_s = time.perf_counter() - t
+
+    t = time.perf_counter()
+    got, _ = app._newest_by_family(objects)
+    new_s = time.perf_counter() - t
+    assert got == expected, "classify_key disagrees with the old predicates"
+
+    # family mode only sees files stored directly under the prefix
+    top_level = old_newest([o for o in objects if "/" not in o["Key"][len(prefix):]])
+
+    results = {"keys": args.keys, "classify": {"old_s": round(old_s, 4), "new_s": round(new_s, 4)}}
+    for mode, want in (("full", expected), ("family", top_level)):
+        app.s3 = FakeS3(objects)
+        t = time.perf_counter()
+        newest, seen = app._discover("bench-bucket", prefix, mode=mode)
+        results[mode] = {
+            "elapsed_s": round(time.perf_counter() - t, 4),
+            "objects_seen": seen,
+            "pages": app.s3.pages,
+            "matches_expected": newest == want,
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
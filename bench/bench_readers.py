@@ -0,0 +1,73 @@
+"""
+Compare workbook reader backends on generated ccprov, labor and schedule
+workbooks. Every backend's rows are checked against the openpyxl/xlrd path.
+
+    pip install python-calamine   # optional fast backend
+    python bench/bench_readers.py --prov-rows 20000 --labor-rows 50000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import workbook_reader  # noqa: E402
+from synthetic import write_labor_workbook, write_prov_workbook, write_schedule_workbook  # noqa: E402
+
+
+def _rows(path, backend):
+    # Trailing padding differs between backends and is ignored by the cleaners.
+    out = []
+    for row in workbook_reader.iter_rows(path, backend=backend):
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        out.append(row)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark workbook reader backends.")
+    parser.add_argument("--prov-rows", type=int, default=10000)
+    parser.add_argument("--labor-rows", type=int, default=20000)
+    parser.add_argument("--clinics", type=int, default=10)
+    args = parser.parse_args()
+
+    backends = ["openpyxl"]
+    if workbook_reader.CalamineWorkbook is not None:
+        backends.append("calamine")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {
+            "ccprov": write_prov_workbook(os.path.join(tmp, "ccprov1_bench.xlsx"), rows=args.prov_rows),
+            "labor": write_labor_workbook(os.path.join(tmp, "labor_bench.xlsx"), rows=args.labor_rows),
+            "ccschedule": write_schedule_workbook(os.path.join(tmp, "ccschedule1_bench.xlsx"), clinics=args.clinics),
+        }
+        for name, path in files.items():
+            baseline = None
+            results[name] = {"bytes": os.path.getsize(path)}
+            for backend in backends:
+                t = time.perf_counter()
+                rows = _rows(path, backend)
+                elapsed = time.perf_counter() - t
+                if baseline is None:
+                    baseline = rows
+                results[name][backend] = {
+                    "elapsed_s": round(elapsed, 4),
+                    "rows": len(rows),
+                    "rows_per_s": round(len(rows) / elapsed) if elapsed else None,
+                    "matches_openpyxl": rows == baseline,
+                }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Check that the vectorized and streaming schedule parsers match the
+row-by-row parser exactly, then time them and compare peak Python heap for
+read + parse of the whole workbook.
+
+    python bench/bench_schedule_parse.py --clinics 20 --employees 40 --weeks 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pandas as pd  # noqa: E402
+
+from pay_ccschedule_clean import (  # noqa: E402
+    _finalize_frame,
+    _read_schedule_workbook,
+    iter_workbook_chunks,
+    iter_workbook_records,
+    parse_frame,
+)
+from synthetic import write_schedule_workbook  # noqa: E402
+
+
+def _timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return out, best
+
+
+def _peak_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    finally:
+        tracemalloc.stop()
+
+
+def _stream_rows(path, chunk_rows):
+    # Consume chunk by chunk, as the loaders do, keeping only a row count.
+    return sum(len(chunk) for chunk in iter_workbook_chunks(path, chunk_rows=chunk_rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row vs vectorized schedule parsing.")
+    parser.add_argument("--clinics", type=int, default=10)
+    parser.add_argument("--employees", type=int, default=40)
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_schedule_workbook(
+            os.path.join(tmp, "ccschedule1_bench.xlsx"),
+            clinics=args.clinics, employees=args.employees, weeks=args.weeks,
+        )
+        df = _read_schedule_workbook(path)
+
+        rows_df, rows_s = _timed(lambda: _finalize_frame(pd.DataFrame(list(iter_workbook_records(df)))), args.repeat)
+        vec_df, vec_s = _timed(lambda: _finalize_frame(parse_frame(df)), args.repeat)
+        stream_df = pd.concat(iter_workbook_chunks(path, chunk_rows=args.chunk_rows), ignore_index=True)
+        _, stream_s = _timed(lambda: _stream_rows(path, args.chunk_rows), args.repeat)
+
+        vec_peak = _peak_mb(lambda: _finalize_frame(parse_frame(_read_schedule_workbook(path))))
+        stream_peak = _peak_mb(lambda: _stream_rows(path, args.chunk_rows))
+
+    pd.testing.assert_frame_equal(rows_df, vec_df)
+    pd.testing.assert_frame_equal(rows_df, stream_df)
+    assert rows_df.to_csv(index=False) == vec_df.to_csv(index=False), "CSV output differs"
+    assert rows_df.to_csv(index=False) == stream_df.to_csv(index=False), "stream CSV output differs"
+
+    print(json.dumps({
+        "sheet_rows": len(df),
+        "shift_rows": len(rows_df),
+        "rows_s": round(rows_s, 4),
+        "vectorized_s": round(vec_s, 4),
+        "speedup": round(rows_s / vec_s, 2) if vec_s else None,
+        "stream_s": round(stream_s, 4),
+        "vectorized_peak_mb": vec_peak,
+        "stream_peak_mb": stream_peak,
+        "equivalent": True,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the execute_values insert path with the COPY loader.
+
+Needs a local Postgres reachable through DB_CREDENTIALS, e.g.
+
+    docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:15
+    DB_CREDENTIALS='{"host":"localhost","port":5432,"database":"postgres","user":"postgres","password":"postgres"}' \
+        python bench/bench_upload.py --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pay_ccprov_upload import PROV_COLUMNS, _load_table, get_db_connection  # noqa: E402
+
+BENCH_TABLE = "bench.clinic_ccprov"
+
+
+def synthetic_prov_rows(n, seed=0):
+    rnd = random.Random(seed)
+    start = date(2024, 1, 1)
+    for i in range(n):
+        d = start + timedelta(days=i % 365)
+        reg = round(rnd.uniform(0, 12), 2)
+        rate = round(rnd.uniform(15, 60), 2)
+        yield [
+            str(1000 + i % 800), f"Employee {i % 800}", d.isoformat(), d.strftime("%a"), "REG",
+            reg, 0, 0, 0, "08:00", "20:00", f"Clinic {i % 40}", "Provider",
+            rate, rate * 1.5, reg * rate, 0, reg * rate, rate, rate * 1.5,
+            reg * rate, 0, reg * rate,
+        ]
+
+
+def _reset(conn):
+    cur = conn.cursor()
+    cur.execute("CREATE SCHEMA IF NOT EXISTS bench")
+    cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cur.execute(
+        f"CREATE TABLE {BENCH_TABLE} ("
+        + ", ".join(f"{c} text" for c in PROV_COLUMNS)
+        + ", UNIQUE (ee_id, shift_date, time_in))"
+    )
+    conn.commit()
+    return cur
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark insert vs COPY loading.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    results = {}
+    for method in ("insert", "copy"):
+        cur = _reset(conn)
+        t = time.time()
+        _load_table(conn, cur, BENCH_TABLE, PROV_COLUMNS, synthetic_prov_rows(args.rows), method=method)
+        elapsed = time.time() - t
+        cur.execute(f"SELECT count(*) FROM {BENCH_TABLE}")
+        loaded = cur.fetchone()[0]
+        results[method] = {
+            "elapsed_s": round(elapsed, 3),
+            "rows_loaded": loaded,
+            "rows_per_s": round(args.rows / elapsed) if elapsed else None,
+        }
+        cur.close()
+
+    conn.cursor().execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    conn.commit()
+    conn.close()
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+End-to-end benchmark: generate Paylocity-shaped workbooks, put them in a
+moto S3 bucket, run app.handler against a local Postgres, and record
+per-stage time, throughput and memory in a JSON-lines history file.
+
+    docker compose --profile bench up -d bench-postgres
+    pip install -r bench/requirements.txt
+    DB_CREDENTIALS='{"host":"localhost","port":5432,"database":"postgres","user":"postgres","password":"postgres"}' \\
+        python bench/run_pipeline.py --scale 2 --label "calamine reader"
+
+Exits non-zero with --fail-on-regression when a stage is slower than the
+previous run at the same scale by more than --threshold.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+
+from synthetic import write_labor_workbook, write_prov_workbook, write_schedule_workbook  # noqa: E402
+
+BUCKET = "bench-paylocity"
+PREFIX = "drops/"
+# Local only (git-ignored); point BENCH_HISTORY or --history elsewhere to keep several.
+HISTORY = os.getenv("BENCH_HISTORY", os.path.join(HERE, "history.jsonl"))
+
+
+def _mock_aws():
+    try:
+        from moto import mock_aws
+    except ImportError:  # moto < 5
+        from moto import mock_s3 as mock_aws
+    return mock_aws()
+
+
+def generate(tmp, scale):
+    stamp = "20250131"
+    files = {
+        f"ccprov1_{stamp}.xlsx": lambda p: write_prov_workbook(p, rows=5000 * scale, seed=1),
+        f"ccprov2_{stamp}.xlsx": lambda p: write_prov_workbook(p, rows=5000 * scale, seed=2),
+        f"ccstaff_{stamp}.xlsx": lambda p: write_prov_workbook(p, rows=3000 * scale, seed=3),
+        f"Labor_Summary_by_Employee_Retool_Annual_Export_{stamp}.xlsx": lambda p: write_labor_workbook(p, rows=10000 * scale),
+        f"ccschedule1_{stamp}.xlsx": lambda p: write_schedule_workbook(p, clinics=5 * scale, seed=1),
+        f"ccschedule2_{stamp}.xlsx": lambda p: write_schedule_workbook(p, clinics=5 * scale, seed=2),
+        f"ccschedule3_{stamp}.xlsx": lambda p: write_schedule_workbook(p, clinics=5 * scale, seed=3),
+    }
+    return {name: write(os.path.join(tmp, name)) for name, write in files.items()}
+
+
+def _prepare_db(schema):
+    from pay_ccprov_upload import get_db_connection, release_db_connection
+
+    conn = get_db_connection()
+    with open(os.path.join(HERE, schema)) as f:
+        conn.cursor().execute(f.read())
+    conn.commit()
+    release_db_connection(conn)
+
+
+class _Context:
+    aws_request_id = "bench"
+
+
+def run(scale, schema="schema.sql"):
+    import boto3
+    import telemetry
+
+    with tempfile.TemporaryDirectory() as tmp, _mock_aws():
+        t = time.perf_counter()
+        files = generate(tmp, scale)
+        generate_s = time.perf_counter() - t
+        input_bytes = sum(os.path.getsize(p) for p in files.values())
+
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_DEFAULT_REGION"]}
+        )
+        for name, path in files.items():
+            boto3.client("s3").upload_file(path, BUCKET, PREFIX + name)
+
+        import app  # imported inside the mock so its module-level client is patched
+
+        _prepare_db(schema)
+        t = time.perf_counter()
+        result = app.handler({"force_refresh": True}, _Context())
+        total_s = time.perf_counter() - t
+
+    stages = {}
+    for path, values in telemetry._aggregate(telemetry._spans).items():
+        seconds = values["duration_ms"] / 1000
+        entry = {"seconds": round(seconds, 3), "peak_rss_mb": values.get("peak_rss_mb")}
+        for field in ("rows", "bytes"):
+            if field in values and seconds:
+                entry[f"{field}_per_s"] = round(values[field] / seconds)
+        stages[path] = entry
+
+    return {
+        "generate_s": round(generate_s, 3),
+        "total_s": round(total_s, 3),
+        "input_bytes": input_bytes,
+        "row_count": result.get("row_count"),
+        "counters": telemetry.counters(),
+        "stages": stages,
+    }
+
+
+def _previous(history, scale, env):
+    if not os.path.exists(history):
+        return None
+    last = None
+    with open(history) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["scale"] == scale and entry["env"] == env:
+                last = entry
+    return last
+
+
+def _regressions(prev, cur, threshold, min_seconds=0.05):
+    out = []
+    for stage, now in cur["stages"].items():
+        before = prev["stages"].get(stage)
+        if before is None or before["seconds"] < min_seconds:
+            continue
+        if now["seconds"] > before["seconds"] * (1 + threshold):
+            out.append({"stage": stage, "before_s": before["seconds"], "now_s": now["seconds"]})
+    return out
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark.")
+    parser.add_argument("--scale", type=int, default=1, help="multiplies rows/clinics in every generated file")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown per stage (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-history", action="store_true")
+    parser.add_argument("--history", default=HISTORY, help="JSON-lines history file (default: bench/history.jsonl)")
+    parser.add_argument("--schema", default="schema.sql",
+                        help="DDL file in bench/, e.g. schema_partitioned.sql with LOAD_STRATEGY=partition")
+    args = parser.parse_args()
+
+    if "DB_CREDENTIALS" not in os.environ:
+        parser.error("DB_CREDENTIALS must point at a local Postgres")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-2")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ["S3_BUCKET"] = BUCKET
+    os.environ["S3_PREFIX"] = PREFIX
+    os.environ.setdefault("TELEMETRY", "false")  # keep EMF lines out of the report
+
+    # Settings that change what is measured are part of the comparison key.
+    env = {k: v for k, v in sorted(os.environ.items()) if k in (
+        "PIPELINE_MODE", "LOAD_STRATEGY", "LOAD_CONCURRENCY", "UPLOAD_METHOD",
+        "XLSX_READER_BACKEND", "SCHEDULE_PARSER", "CLEAN_WORKERS", "PARTITION_GRAIN", "LOAD_COERCE",
+        "LABOR_AGGREGATES",
+    )}
+    if args.schema != "schema.sql":
+        env["schema"] = args.schema
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_rev(),
+        "label": args.label,
+        "scale": args.scale,
+        "env": env,
+        **run(args.scale, args.schema),
+    }
+
+    prev = _previous(args.history, args.scale, env)
+    regressions = _regressions(prev, entry, args.threshold) if prev else []
+    entry["regressions"] = regressions
+
+    if not args.no_history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    print(json.dumps(entry, indent=2))
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+-- Range-partitioned variant of schema.sql for LOAD_STRATEGY=partition.
+-- Recreates the tables on every run; partitions are created by the loader.
+CREATE SCHEMA IF NOT EXISTS app;
+
+DROP TABLE IF EXISTS app.clinic_ccprov, app.clinic_ccstaff, app.clinic_labor_costs, app.clinic_ccschedule CASCADE;
+
+CREATE TABLE app.clinic_ccprov (
+    ee_id text, employee_name text, shift_date date, day text, pay_type text,
+    reg_hours numeric, ot1_hours numeric, ot2_hours numeric, unpaid_hours numeric,
+    time_in text, time_out text, cc1 text, cc2 text,
+    reg_charge_rate numeric, ot_charge_rate numeric, reg_charge_amount numeric, ot_charge_amount numeric,
+    total_charge_amount numeric, reg_pay_rate numeric, ot_pay_rate numeric,
+    reg_paid numeric, ot_paid numeric, total_pay_amount numeric
+) PARTITION BY RANGE (shift_date);
+
+CREATE TABLE app.clinic_ccstaff (LIKE app.clinic_ccprov) PARTITION BY RANGE (shift_date);
+
+CREATE TABLE app.clinic_labor_costs (
+    company text, ee_id text, cntlast text, cntfirst text, cntdept text, cndarea text,
+    last_check_dt date, cc1 text, cc2 text,
+    reg_hours numeric, reg_amount numeric, ot_hours numeric, ot_amount numeric,
+    bonus_amount numeric, other_amount numeric,
+    suta numeric, futa numeric, ss_tax numeric, mcare_tax numeric, other_tax numeric,
+    ret_ben numeric, med_ben numeric, dent_ben numeric, vis_ben numeric, oth_ben numeric
+) PARTITION BY RANGE (last_check_dt);
+
+CREATE TABLE app.clinic_ccschedule (
+    cc1 text, employee_name text, employee_number text, shift_date date, shift_day text,
+    shift text, shift_hours numeric, manual_attendance boolean, manual_attendance_points text
+) PARTITION BY RANGE (shift_date);
+
+CREATE INDEX ON app.clinic_ccprov (shift_date);
+CREATE INDEX ON app.clinic_ccstaff (shift_date);
+CREATE INDEX ON app.clinic_labor_costs (last_check_dt);
+CREATE INDEX ON app.clinic_ccschedule (shift_date);
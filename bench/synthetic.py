@@ -0,0 +1,151 @@
+"""Synthetic Paylocity-shaped workbooks for the benchmarks."""
+import random
+from datetime import date, datetime, timedelta
+
+from openpyxl import Workbook
+
+SCHEDULE_DATE_COLS = [4, 6, 8, 11, 14, 15, 17]  # E, G, I, L, O, P, R
+SCHEDULE_WIDTH = 19
+
+SHIFTS = [
+    "8:00 AM - 8:00 PM",
+    "7a-7p",
+    "9:00 AM - 5:30 PM",
+    "10 - 6",
+    "12:00 PM - 12:00 AM",
+    "7:00 PM - 7:00 AM",
+    "OFF",
+    "PTO",
+    None,
+]
+DAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+
+
+def write_schedule_workbook(path, clinics=5, employees=30, weeks=4, seed=0, start=date(2025, 1, 5)):
+    """
+    Multi-clinic "Detailed Schedules" export: a clinic row, then per week a
+    day-name row, a Name/date header row, employee rows (some followed by the
+    two Manual Attendance rows) and a Totals: row.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Detailed Schedules"])
+    ws.append(["Report by Department"])
+    # Employee rows before any header are ignored by the parser.
+    ws.append(["Orphan Employee", 999] + [None] * (SCHEDULE_WIDTH - 2))
+
+    for c in range(clinics):
+        ws.append([f"URGENT CARE {c} NORTH"] + [None] * (SCHEDULE_WIDTH - 1))
+        if c % 4 == 3:
+            ws.append(["Wendy"])
+        for w in range(weeks):
+            week_start = start + timedelta(days=7 * w)
+            row = [None] * SCHEDULE_WIDTH
+            for i, col in enumerate(SCHEDULE_DATE_COLS):
+                row[col] = DAYS[i]
+            ws.append(row)
+            row = [None] * SCHEDULE_WIDTH
+            row[0] = "Name"
+            row[1] = "Employee #"
+            for i, col in enumerate(SCHEDULE_DATE_COLS):
+                d = week_start + timedelta(days=i)
+                # Mix real dates and text dates like the exports do.
+                row[col] = datetime(d.year, d.month, d.day) if w % 2 else f"{d.month}/{d.day}/{d.year}"
+            ws.append(row)
+            for e in range(employees):
+                row = [None] * SCHEDULE_WIDTH
+                row[0] = f"Employee\xa0{c}-{e} "
+                row[1] = float(10000 + c * 1000 + e)
+                for col in SCHEDULE_DATE_COLS:
+                    row[col] = rnd.choice(SHIFTS)
+                manual_col = rnd.choice(SCHEDULE_DATE_COLS) if rnd.random() < 0.1 else None
+                if manual_col is not None:
+                    row[manual_col] = "Manual Attendance"
+                ws.append(row)
+                if manual_col is not None:
+                    points = [None] * SCHEDULE_WIDTH
+                    points[manual_col] = rnd.choice([0.5, 1.0, 2.0])
+                    ws.append(points)
+                    shift = [None] * SCHEDULE_WIDTH
+                    shift[manual_col] = rnd.choice(SHIFTS[:6])
+                    ws.append(shift)
+            ws.append(["Totals:"] + [None] * (SCHEDULE_WIDTH - 1))
+
+    # A trailing Manual Attendance with no follow-up rows.
+    row = ["Last Employee", 1.0] + [None] * (SCHEDULE_WIDTH - 2)
+    row[SCHEDULE_DATE_COLS[-1]] = "Manual Attendance"
+    ws.append(row)
+    wb.save(path)
+    return path
+
+
+PROV_HEADER = [
+    "EE ID", "Employee Name", "Department", "Date", "Day", "Pay Type", "Reg Hours", "OT1 Hours", "OT2 Hours",
+    "Unpaid Hours", "Time In", "Time Out", "CC1", "CC2", "Reg Charge Rate", "OT Charge Rate",
+    "Reg Charge Amount", "OT Charge Amount", "Total Charge Amount", "Reg Pay Rate", "OT Pay Rate",
+    "Reg Paid", "OT Paid", "Total Pay Amount",
+]
+
+LABOR_HEADER = [
+    "Company", "EE ID", "Last", "First", "Dept", "Area", "Last Check Date", "CC1", "CC2",
+    "Reg Hours", "Reg Amount", "OT Hours", "OT Amount", "Bonus Amount", "Other Amount",
+    "SUTA", "FUTA", "SS Tax", "Medicare Tax", "Other Tax", "Retirement", "Medical", "Dental", "Vision", "Other Benefit",
+]
+
+
+def write_prov_workbook(path, rows=5000, employees=400, clinics=40, seed=0, start=date(2025, 1, 1)):
+    """
+    ccprov/ccstaff export: 5 report header rows, a column header row, and a
+    Department column C that the cleaner drops.
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Punch Detail with Charge Rates"])
+    ws.append(["Company: Urgent Care Kids"])
+    ws.append([f"Period: {start.isoformat()} - {(start + timedelta(days=365)).isoformat()}"])
+    ws.append([None])
+    ws.append(["Generated by Paylocity"])
+    ws.append(PROV_HEADER)
+    for i in range(rows):
+        d = start + timedelta(days=i % 365)
+        ee = i % employees
+        reg = round(rnd.uniform(0, 12), 2)
+        ot = round(rnd.choice([0, 0, 0, rnd.uniform(0, 4)]), 2)
+        charge = round(rnd.uniform(20, 90), 2)
+        pay = round(rnd.uniform(15, 60), 2)
+        ws.append([
+            1000 + ee, f"Employee {ee}", "Clinical", datetime(d.year, d.month, d.day), d.strftime("%A"), "REG",
+            reg, ot, 0, 0, "08:00 AM", "08:00 PM", f"Clinic {ee % clinics}", "Provider",
+            charge, round(charge * 1.5, 2), round(reg * charge, 2), round(ot * charge * 1.5, 2),
+            round(reg * charge + ot * charge * 1.5, 2), pay, round(pay * 1.5, 2),
+            round(reg * pay, 2), round(ot * pay * 1.5, 2), round(reg * pay + ot * pay * 1.5, 2),
+        ])
+        if i % 500 == 499:
+            ws.append([None] * len(PROV_HEADER))
+    wb.save(path)
+    return path
+
+
+def write_labor_workbook(path, rows=20000, employees=400, clinics=40, seed=0, start=date(2025, 1, 3)):
+    """Annual labor summary export: header on row 1, one row per employee per check date."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(LABOR_HEADER)
+    for i in range(rows):
+        ee = i % employees
+        check = start + timedelta(days=14 * ((i // employees) % 26))
+        reg_hours = round(rnd.uniform(20, 80), 2)
+        rate = round(rnd.uniform(15, 60), 2)
+        ws.append([
+            "UCK", 1000 + ee, f"Last{ee}", f"First{ee}", "Clinical", "Clinic", datetime(check.year, check.month, check.day),
+            f"Clinic {ee % clinics}", "Provider", reg_hours, round(reg_hours * rate, 2),
+            round(rnd.uniform(0, 10), 2), round(rnd.uniform(0, 500), 2), 0, 0,
+            round(rnd.uniform(0, 30), 2), round(rnd.uniform(0, 10), 2), round(rnd.uniform(50, 200), 2),
+            round(rnd.uniform(10, 50), 2), 0, round(rnd.uniform(0, 100), 2), round(rnd.uniform(0, 300), 2),
+            round(rnd.uniform(0, 40), 2), round(rnd.uniform(0, 10), 2), 0,
+        ])
+    wb.save(path)
+    return path
@@ -2,15 +2,36 @@ import psycopg2
 import boto3
 import json
 import os
+import time
 
+# Decrypted credentials are kept for this many seconds so warm invocations
+# skip the SSM round trip; rotation is picked up once the TTL lapses.
+CREDENTIALS_TTL_S = int(os.getenv("DB_CREDENTIALS_TTL_S", "300"))
 
+_ssm = None
+# {parameter name: (credentials, fetched at)}
+_credentials = {}
+
+
+def _ssm_client():
+    global _ssm
+    if _ssm is None:
+        _ssm = boto3.client('ssm')
+        #_ssm = boto3.client('ssm',  aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'], aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],  region_name='us-east-2')
+    return _ssm
+
+
+def get_credentials(name='db_postgres_easebase_internal', refresh=False):
+    cached = _credentials.get(name)
+    if refresh or cached is None or time.time() - cached[1] > CREDENTIALS_TTL_S:
+        param = _ssm_client().get_parameter(Name=name, WithDecryption=True )
+        cached = _credentials[name] = (json.loads(param['Parameter']['Value']), time.time())
+    return cached[0]
 
 
 def easebase_conn():
-    ssm = boto3.client('ssm')
-    #ssm = boto3.client('ssm',  aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'], aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],  region_name='us-east-2')
-    param = ssm.get_parameter(Name='db_postgres_easebase_internal', WithDecryption=True )
-    db_request = json.loads(param['Parameter']['Value']) 
+    # Opens a new connection on every call; the caller closes it.
+    db_request = get_credentials()
 
     hostname = db_request['host']
     portno = db_request['port']
@@ -19,4 +40,4 @@ def easebase_conn():
     dbpassword = db_request['password']
     conn = psycopg2.connect(host=hostname,user=dbusername,port=portno,password=dbpassword,dbname=dbname)
     conn.autocommit = False
-    return conn
\ No newline at end of file
+    return conn
@@ -1,11 +1,45 @@
+import time, json
+_init_started = time.perf_counter()
 import os
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
 import boto3
-import time, json
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
-from pay_ccprov_clean import clean_ccprov_and_ccstaff
-from pay_ccprov_upload import upload_to_postgres
-from pay_ccschedule_clean import clean_ccschedule_files
+from pay_ccprov_clean import clean_ccprov_and_ccstaff, iter_ccprov_and_ccstaff, merge_prov_frames, parse_prov_frame
+from pay_ccprov_upload import (
+    frame_rows,
+    db_connection_info,
+    get_db_connection,
+    iter_xlsx_rows,
+    read_labor_frame,
+    refresh_aggregates,
+    release_db_connection,
+    stage_shadow,
+    swap_staged,
+    upload_rows_to_postgres,
+    upload_to_postgres,
+)
+from pay_clean_archive import CLEAN_ARCHIVE, archived_parse, find_archived
+from pay_parallel import imap_bounded
+from pay_parsed_cache import cached_parse
+from pay_preflight import PREFLIGHT, preflight
+import telemetry
+from pay_load_state import (
+    TABLE_SOURCES,
+    get_completed_sets,
+    get_loaded_sources,
+    record_loaded_sources,
+    record_set_done,
+    stale_tables,
+)
 
 s3 = boto3.client(
     "s3",
@@ -13,22 +47,82 @@ s3 = boto3.client(
         connect_timeout=5,
         read_timeout=20,
         retries={"max_attempts": 2, "mode": "standard"},
+        max_pool_connections=32,
     ),
 )
 
 BUCKET = os.environ["S3_BUCKET"]
 PREFIX = os.getenv("S3_PREFIX", "")
 
+# "files" writes cleaned CSVs to /tmp and loads them; "stream" pipes cleaner
+# generators straight into the COPY loader without intermediate files;
+# "typed" parses each workbook once into a DataFrame (cached in /tmp by
+# content hash across warm invocations) and loads from the frames; "staged"
+# runs the fan-out stages (discover_stage, stage_table, commit_stage) in this
+# process with STAGE_WORKERS tables at a time.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "files")
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "4"))
+
+# Skip download/clean/load for tables whose sources have the same key and ETag
+# as the last successful load. {"force_refresh": true} in the event reloads all.
+INCREMENTAL_LOAD = os.getenv("INCREMENTAL_LOAD", "true").lower() in ("1", "true", "yes")
+
+DOWNLOAD_WORKERS = int(os.getenv("S3_DOWNLOAD_WORKERS", "7"))
+DOWNLOAD_RETRIES = int(os.getenv("S3_DOWNLOAD_RETRIES", "3"))
+
+# Multipart ranged GETs only kick in above the threshold, i.e. for the labor export.
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024,
+    multipart_chunksize=int(os.getenv("S3_MULTIPART_CHUNK_MB", "8")) * 1024 * 1024,
+    max_concurrency=int(os.getenv("S3_MULTIPART_CONCURRENCY", "8")),
+)
+
+# Source family -> (file name prefix, accepted extensions). Prefixes are
+# case-sensitive, extensions are not.
 WANTS = {
-    "ccprov1": lambda k: os.path.basename(k).startswith("ccprov1_") and k.lower().endswith(".xlsx"),
-    "ccprov2": lambda k: os.path.basename(k).startswith("ccprov2_") and k.lower().endswith(".xlsx"),
-    "ccstaff": lambda k: os.path.basename(k).startswith("ccstaff_") and k.lower().endswith(".xlsx"),
-    "labor": lambda k: os.path.basename(k).startswith("Labor_Summary_by_Employee_Retool_Annual_Export_") and k.lower().endswith(".xlsx"),
-    "ccschedule1": lambda k: os.path.basename(k).startswith("ccschedule1_") and k.lower().endswith((".xls", ".xlsx")),
-    "ccschedule2": lambda k: os.path.basename(k).startswith("ccschedule2_") and k.lower().endswith((".xls", ".xlsx")),
-    "ccschedule3": lambda k: os.path.basename(k).startswith("ccschedule3_") and k.lower().endswith((".xls", ".xlsx")),
+    "ccprov1": ("ccprov1_", (".xlsx",)),
+    "ccprov2": ("ccprov2_", (".xlsx",)),
+    "ccstaff": ("ccstaff_", (".xlsx",)),
+    "labor": ("Labor_Summary_by_Employee_Retool_Annual_Export_", (".xlsx",)),
+    "ccschedule1": ("ccschedule1_", (".xls", ".xlsx")),
+    "ccschedule2": ("ccschedule2_", (".xls", ".xlsx")),
+    "ccschedule3": ("ccschedule3_", (".xls", ".xlsx")),
 }
 
+# One alternation over every prefix, so each key is matched once instead of per family.
+_FAMILY_RE = re.compile("|".join(f"(?P<{name}>{re.escape(prefix)})" for name, (prefix, _) in WANTS.items()))
+
+# "full" pages through everything under S3_PREFIX; "family" lists each
+# family's own sub-prefix (its file name prefix inside the S3_PREFIX folder,
+# with or without a trailing "/") concurrently, which only sees files stored
+# directly under S3_PREFIX.
+LIST_MODE = os.getenv("S3_LIST_MODE", "full")
+DEBUG = os.getenv("LOG_LEVEL", "INFO").upper() == "DEBUG"
+
+# pandas/numpy (via pay_ccschedule_clean) are imported on first use rather
+# than at init, so runs that skip on an unchanged manifest never load them.
+# With PRELOAD_IMPORTS they are imported on a background thread once there is
+# work to do, overlapping the import with the S3 downloads.
+PRELOAD_IMPORTS = os.getenv("PRELOAD_IMPORTS", "true").lower() in ("1", "true", "yes")
+
+def _preload_imports():
+    if PRELOAD_IMPORTS:
+        threading.Thread(target=__import__, args=("pay_ccschedule_clean",), daemon=True).start()
+
+def _shift_hours_cache_info():
+    # Only report the caches if the schedule cleaner was actually loaded.
+    module = sys.modules.get("pay_ccschedule_clean")
+    return module.shift_hours_cache_info() if module else None
+
+def _cold_start_info():
+    """Module import time on the first invocation of a container, for the init cost."""
+    global _cold_start
+    info = {"cold_start": _cold_start, "init_s": _INIT_S if _cold_start else None}
+    if _cold_start:
+        telemetry.count("init_ms", round(_INIT_S * 1000, 1))
+    _cold_start = False
+    return info
+
 def log_checkpoint(name, start, extra=None):
     elapsed = round(time.time() - start, 3)
     msg = {"checkpoint": name, "elapsed_s": elapsed}
@@ -36,53 +130,510 @@ def log_checkpoint(name, start, extra=None):
         msg["extra"] = extra
     print(json.dumps(msg))
 
+def classify_key(key: str):
+    """The WANTS family a key belongs to, or None."""
+    m = _FAMILY_RE.match(key.rpartition("/")[2])
+    if m is None:
+        return None
+    family = m.lastgroup
+    if not key.lower().endswith(WANTS[family][1]):
+        return None
+    return family
+
 def _list_objects(bucket: str, prefix: str):
-    print(json.dumps({"msg": "_list_objects_enter", "bucket": bucket, "prefix": prefix}))
+    if DEBUG:
+        print(json.dumps({"msg": "_list_objects_enter", "bucket": bucket, "prefix": prefix}))
     paginator = s3.get_paginator("list_objects_v2")
     kwargs = {"Bucket": bucket}
     if prefix:
         kwargs["Prefix"] = prefix
 
-    print(json.dumps({"msg": "_list_objects_paginate_start", "kwargs": kwargs}))
+    if DEBUG:
+        print(json.dumps({"msg": "_list_objects_paginate_start", "kwargs": kwargs}))
     for page in paginator.paginate(**kwargs):
-        print(json.dumps({"msg": "_list_objects_page_received", "key_count": page.get("KeyCount")}))
+        if DEBUG:
+            print(json.dumps({"msg": "_list_objects_page_received", "key_count": page.get("KeyCount")}))
         for obj in page.get("Contents", []):
-            print("LISTED", obj["Key"])
+            if DEBUG:
+                print("LISTED", obj["Key"])
             yield obj
 
-def _download(bucket: str, key: str) -> str:
-    local = f"/tmp/{os.path.basename(key)}"
-    s3.download_file(bucket, key, local)
+def _newest_by_family(objects):
+    """Returns ({family: newest object or None}, objects seen)."""
+    newest = {name: None for name in WANTS}
+    count = 0
+    for obj in objects:
+        count += 1
+        family = classify_key(obj["Key"])
+        if family is None:
+            continue
+        cur = newest[family]
+        if cur is None or obj["LastModified"] > cur["LastModified"]:
+            newest[family] = obj
+    return newest, count
+
+def _discover(bucket: str, prefix: str, mode: str = None):
+    mode = mode or LIST_MODE
+    if mode == "full":
+        return _newest_by_family(_list_objects(bucket, prefix))
+    if mode != "family":
+        raise ValueError(f"Unknown S3_LIST_MODE: {mode}")
+
+    def _one(name):
+        family_prefix = posixpath.join(prefix, WANTS[name][0])
+        found, count = _newest_by_family(_list_objects(bucket, family_prefix))
+        return found[name], count
+
+    with ThreadPoolExecutor(max_workers=len(WANTS)) as pool:
+        results = dict(zip(WANTS, pool.map(telemetry.bind(_one), WANTS)))
+    newest = {name: obj for name, (obj, _) in results.items()}
+    return newest, sum(count for _, count in results.values())
+
+def _download(bucket: str, key: str, out_dir: str = "/tmp") -> str:
+    local = os.path.join(out_dir, os.path.basename(key))
+    s3.download_file(bucket, key, local, Config=TRANSFER_CONFIG)
     return local
 
-def handler(event, context):
+def _download_with_retry(name: str, bucket: str, key: str, retries: int = DOWNLOAD_RETRIES, out_dir: str = "/tmp") -> str:
+    t = time.time()
+    for attempt in range(1, retries + 1):
+        try:
+            with telemetry.span(f"download_{name}") as sp:
+                local = _download(bucket, key, out_dir)
+                sp["bytes"] = os.path.getsize(local)
+                sp["attempts"] = attempt
+            telemetry.count("bytes_downloaded", sp["bytes"])
+            log_checkpoint(f"download_{name}_done", t, {"key": key, "attempt": attempt})
+            return local
+        except Exception as e:
+            print(json.dumps({"msg": "download_failed", "name": name, "key": key, "attempt": attempt, "error": str(e)}))
+            if attempt == retries:
+                raise
+            time.sleep(min(2 ** attempt, 10))
+
+def _download_all(bucket: str, objects: dict, workers: int = DOWNLOAD_WORKERS, out_dir: str = "/tmp") -> dict:
+    """Download {name: s3 object} concurrently into out_dir; returns {name: local path}."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            name: pool.submit(telemetry.bind(_download_with_retry), name, bucket, obj["Key"], out_dir=out_dir)
+            for name, obj in objects.items()
+        }
+        return {name: f.result() for name, f in futures.items()}
+
+def _stream_clean_and_upload(local):
+    from pay_ccschedule_clean import iter_schedule_rows
+
+    ccprov_rows, ccstaff_rows = None, None
+    if "ccprov1" in local or "ccstaff" in local:
+        ccprov_rows, ccstaff_rows = iter_ccprov_and_ccstaff(
+            [local[n] for n in ("ccprov1", "ccprov2") if n in local],
+            [local[n] for n in ("ccstaff",) if n in local],
+        )
+    schedule_paths = [local[n] for n in ("ccschedule1", "ccschedule2", "ccschedule3") if n in local]
+    return upload_rows_to_postgres(
+        ccprov_rows,
+        ccstaff_rows,
+        iter_xlsx_rows(local["labor"], header_row=1) if "labor" in local else None,
+        iter_schedule_rows(schedule_paths) if schedule_paths else None,
+    )
+
+# Parsed-frame kind per source family, for the parsed cache and the clean archive.
+SOURCE_KINDS = {
+    "ccprov1": "prov",
+    "ccprov2": "prov",
+    "ccstaff": "prov",
+    "labor": "labor",
+    "ccschedule1": "schedule",
+    "ccschedule2": "schedule",
+    "ccschedule3": "schedule",
+}
+
+def _parse_source(name, path, source=None):
+    kind = SOURCE_KINDS[name]
+    if kind == "prov":
+        parse_fn = parse_prov_frame
+    elif kind == "labor":
+        parse_fn = read_labor_frame
+    else:
+        from pay_ccschedule_clean import parse_workbook as parse_fn
+    if CLEAN_ARCHIVE:
+        return archived_parse(path, kind, parse_fn, source=source)
+    return cached_parse(path, kind, parse_fn)
+
+def _typed_table_rows(local, archived=None, newest=None):
+    """
+    Row iterables for upload_rows_to_postgres from parsed frames: archived
+    holds {name: frame} already read from the clean archive; the files in
+    local are parsed (and archived) here, before this returns.
+    """
+    import pandas as pd
+
+    frames = dict(archived or {})
+    for name, path in local.items():
+        frames[name] = _parse_source(name, path, (newest or {}).get(name))
+
+    def _family(names):
+        present = [n for n in names if n in frames]
+        if not present:
+            return None
+        return [local.get(n, n) for n in present], [frames[n] for n in present]
+
+    ccprov = _family(("ccprov1", "ccprov2"))
+    ccstaff = _family(("ccstaff",))
+    labor = _family(("labor",))
+    schedule = _family(("ccschedule1", "ccschedule2", "ccschedule3"))
+
+    return (
+        frame_rows(merge_prov_frames(*ccprov)) if ccprov else None,
+        frame_rows(merge_prov_frames(*ccstaff)) if ccstaff else None,
+        frame_rows(labor[1][0]) if labor else None,
+        frame_rows(pd.concat(schedule[1], ignore_index=True)) if schedule else None,
+    )
+
+def _typed_clean_and_upload(local, archived=None, newest=None):
+    return upload_rows_to_postgres(*_typed_table_rows(local, archived, newest))
+
+def _preflight(objects):
+    """Fail on a source whose header does not fit its table's schema, before any download or load."""
+    if not PREFLIGHT or not objects:
+        return
+    t = time.time()
+    with telemetry.span("preflight") as sp:
+        preflight(s3, BUCKET, objects)
+        sp["files"] = len(objects)
+    log_checkpoint("preflight_done", t, {"files": len(objects)})
+
+def _stale_sources(newest, force):
+    """Returns (tables to reload, source names to fetch) given the manifest and force flag."""
+    if not INCREMENTAL_LOAD:
+        return list(TABLE_SOURCES), list(newest)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        loaded = get_loaded_sources(cursor)
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    tables = stale_tables(newest, loaded, force=force)
+    sources = [s for table_name in tables for s in TABLE_SOURCES[table_name]]
+    return tables, sources
+
+def _record_loaded(newest, tables):
+    if not INCREMENTAL_LOAD or not tables:
+        return
+    conn = get_db_connection()
+    try:
+        record_loaded_sources(conn.cursor(), newest, tables)
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+
+# Fan-out stages. In AWS each runs as its own invocation of this image
+# (discover_handler, stage_handler per work item, commit_handler; see
+# stepfunctions/pipeline.asl.json), so wall time follows the slowest table
+# instead of the sum. Workers commit into shadow tables, and only the commit
+# stage touches the live tables, swapping all of them in one transaction.
+
+def _table_rows(table_name, local):
+    """Row iterator for one target table from its downloaded sources."""
+    paths = [local[name] for name in TABLE_SOURCES[table_name]]
+    if table_name == "app.clinic_ccprov":
+        return iter_ccprov_and_ccstaff(paths, [])[0]
+    if table_name == "app.clinic_ccstaff":
+        return iter_ccprov_and_ccstaff([], paths)[1]
+    if table_name == "app.clinic_labor_costs":
+        return iter_xlsx_rows(paths[0], header_row=1)
+    from pay_ccschedule_clean import iter_schedule_rows
+
+    return iter_schedule_rows(paths)
+
+def discover_stage(event):
+    """
+    Find the newest source files and return one work item per stale table.
+    The result is plain JSON so a state machine can hand it on; pass
+    "run_id" to reuse one, otherwise a new one is generated.
+    """
+    event = event or {}
+    t = time.time()
+    run_id = event.get("run_id") or str(uuid.uuid4())
+    with telemetry.span("discover") as sp:
+        newest, count = _discover(BUCKET, PREFIX)
+        sp["objects_seen"] = count
+    missing = [name for name, obj in newest.items() if obj is None]
+    if missing:
+        raise RuntimeError(f"Missing required files in s3://{BUCKET}/{PREFIX or ''}: {missing}")
+
+    force = bool(event.get("force_refresh"))
+    with telemetry.span("state_check"):
+        tables, sources = _stale_sources(newest, force)
+    _preflight({name: newest[name] for name in sources})
+    newest = {
+        name: {"Key": obj["Key"], "ETag": obj.get("ETag"), "LastModified": obj["LastModified"].isoformat()}
+        for name, obj in newest.items()
+    }
+    items = [
+        {"run_id": run_id, "table": table_name, "sources": {s: newest[s]["Key"] for s in TABLE_SOURCES[table_name]}}
+        for table_name in tables
+    ]
+    log_checkpoint("discover_stage_done", t, {"run_id": run_id, "stale_tables": tables, "force_refresh": force})
+    return {"run_id": run_id, "newest": newest, "items": items}
+
+def stage_table(item):
+    """Download one work item's sources, clean them and commit the rows to the table's shadow."""
+    t = time.time()
+    table_name = item["table"]
+    if table_name == "app.clinic_ccschedule":
+        _preload_imports()
+    with telemetry.span(f"stage_{table_name}"):
+        with telemetry.span("download"):
+            local = _download_all(BUCKET, {name: {"Key": key} for name, key in item["sources"].items()})
+        rows = stage_shadow(table_name, _table_rows(table_name, local), item["run_id"])
+    log_checkpoint("stage_table_done", t, {"run_id": item["run_id"], "table": table_name, "rows": rows})
+    return {"table": table_name, "rows": rows}
+
+def commit_stage(event):
+    """
+    Swap in every staged table and record the manifest in one transaction.
+    event is discover_stage's result plus "results", the stage_table results.
+    """
+    t = time.time()
+    tables = [item["table"] for item in event["items"]]
+    picked = {name: obj["Key"] for name, obj in event["newest"].items()}
+    if not tables:
+        log_checkpoint("commit_stage_done", t, {"skipped": True})
+        return {"ok": True, "skipped": True, "picked": picked, "merged_csv": None, "row_count": 0}
+
+    rows = {result["table"]: result["rows"] for result in event.get("results") or []}
+    unstaged = [table_name for table_name in tables if table_name not in rows]
+    if unstaged:
+        raise RuntimeError(f"Tables were not staged for run {event['run_id']}: {unstaged}")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        with telemetry.span("swap"):
+            swap_staged(cursor, tables, event["run_id"])
+            # Swapped tables were replaced whole; rebuilt in the same transaction.
+            refresh_aggregates(cursor, {table_name: None for table_name in tables})
+            if INCREMENTAL_LOAD:
+                record_loaded_sources(cursor, event["newest"], tables)
+            conn.commit()
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+    log_checkpoint("commit_stage_done", t, {"run_id": event["run_id"], "rows": rows})
+    return {
+        "ok": True,
+        "picked": picked,
+        "loaded_tables": tables,
+        "merged_csv": None,
+        "row_count": rows.get("app.clinic_ccschedule", 0),
+    }
+
+def run_stages_locally(event):
+    """The fan-out stages in one process, with a thread per work item; for tests and PIPELINE_MODE=staged."""
+    plan = discover_stage(event)
+    with ThreadPoolExecutor(max_workers=max(1, STAGE_WORKERS)) as pool:
+        # list() re-raises the first worker failure
+        results = list(pool.map(telemetry.bind(stage_table), plan["items"]))
+    return commit_stage({**plan, "results": results})
+
+def _invoke(stage, fn, event):
+    telemetry.reset()
+    print(json.dumps({"msg": f"{stage}_start", **_cold_start_info()}))
+    try:
+        with telemetry.span(stage):
+            return fn(event)
+    finally:
+        telemetry.emit(Function=os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local"), PipelineMode="staged")
+
+def discover_handler(event, context):
+    return _invoke("discover_stage", discover_stage, event)
+
+def stage_handler(event, context):
+    return _invoke("stage_table", stage_table, event)
+
+def commit_handler(event, context):
+    return _invoke("commit_stage", commit_stage, event)
+
+# Backfill: load every historical drop in the bucket, not just the newest.
+# Matching keys are grouped into file sets by the YYYYMMDD stamp in the file
+# name (the object's LastModified date when there is none) and parsed through
+# the typed pipeline, BACKFILL_WORKERS sets at a time. Sets are loaded oldest
+# first with LOAD_STRATEGY=range, so each replaces only the dates it covers
+# and newer drops win where periods overlap. A table is loaded from a set only
+# when all of its source families are in it. Each loaded set is checkpointed;
+# an invocation about to run out of time stops early and returns done=false,
+# and invoking it again with the same event carries on from the checkpoint
+# (stepfunctions/backfill.asl.json loops until done).
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "2"))
+BACKFILL_STOP_MARGIN_S = int(os.getenv("BACKFILL_STOP_MARGIN_S", "120"))
+
+_STAMP_RE = re.compile(r"\d{8}")
+
+def _file_set_stamp(obj, family):
+    name = obj["Key"].rpartition("/")[2][len(WANTS[family][0]):]
+    m = _STAMP_RE.search(name)
+    return m.group(0) if m else obj["LastModified"].strftime("%Y%m%d")
+
+def backfill_file_sets(objects):
+    """{stamp: {family: object}} for every matching object; the newest object wins within a set."""
+    sets = {}
+    for obj in objects:
+        family = classify_key(obj["Key"])
+        if family is None:
+            continue
+        members = sets.setdefault(_file_set_stamp(obj, family), {})
+        cur = members.get(family)
+        if cur is None or obj["LastModified"] > cur["LastModified"]:
+            members[family] = obj
+    return sets
+
+def _prepare_file_set(file_set):
+    """Download and parse one file set. Returns (stamp, tables, row iterables)."""
+    stamp, members = file_set
+    tables = [t for t, sources in TABLE_SOURCES.items() if all(s in members for s in sources)]
+    objects = {s: members[s] for t in tables for s in TABLE_SOURCES[t]}
+    if len(tables) < len(TABLE_SOURCES):
+        print(json.dumps({
+            "msg": "backfill_partial_set",
+            "file_set": stamp,
+            "skipped_tables": [t for t in TABLE_SOURCES if t not in tables],
+            "missing": sorted(set(WANTS) - set(members)),
+        }))
+    _preflight(objects)
+    with telemetry.span("backfill_prepare"):
+        archived = find_archived(objects, SOURCE_KINDS) if CLEAN_ARCHIVE and objects else {}
+        # Sets are prepared concurrently and often share file names, so each
+        # gets its own directory.
+        out_dir = tempfile.mkdtemp(prefix=f"backfill-{stamp}-")
+        try:
+            local = _download_all(BUCKET, {n: obj for n, obj in objects.items() if n not in archived}, out_dir=out_dir)
+            rows = _typed_table_rows(local, archived, objects)
+        finally:
+            # Frames are parsed by now; keep /tmp from filling up over a long backfill.
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return stamp, tables, rows
+
+def run_backfill(event, context=None):
+    """
+    Load every file set under S3_PREFIX, oldest first. Event keys (all
+    optional): backfill_id names the checkpoint (default "default"), and
+    since/until bound the set stamps (YYYYMMDD, inclusive).
+    """
+    event = event or {}
     t0 = time.time()
-    print(json.dumps({"msg": "handler_start", "request_id": context.aws_request_id}))
+    backfill_id = event.get("backfill_id") or "default"
+    since, until = event.get("since"), event.get("until")
 
-    print(json.dumps({"msg": "list_probe_start", "bucket": BUCKET, "prefix": PREFIX}))
-    probe = s3.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX, MaxKeys=1)
-    print(json.dumps({
-        "msg": "list_probe_done",
-        "key_count": probe.get("KeyCount"),
-        "is_truncated": probe.get("IsTruncated")
-    }))
+    with telemetry.span("discover") as sp:
+        sets = backfill_file_sets(_list_objects(BUCKET, PREFIX))
+        sp["file_sets"] = len(sets)
+    stamps = [s for s in sorted(sets) if (not since or s >= since) and (not until or s <= until)]
 
-    print(json.dumps({"msg": "before_list", "bucket": BUCKET, "prefix": PREFIX}))
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        completed = get_completed_sets(cursor, backfill_id)
+        conn.commit()
+    finally:
+        release_db_connection(conn)
+    pending = [s for s in stamps if s not in completed]
+    log_checkpoint("backfill_plan", t0, {
+        "backfill_id": backfill_id,
+        "file_sets": len(stamps),
+        "already_loaded": len(stamps) - len(pending),
+        "pending": len(pending),
+    })
+    if any(name.startswith("ccschedule") for s in pending for name in sets[s]):
+        _preload_imports()
 
+    loaded, row_count = [], 0
     t = time.time()
-    newest = {name: None for name in WANTS.keys()}
-    count = 0
+    results = imap_bounded(_prepare_file_set, ((s, sets[s]) for s in pending), BACKFILL_WORKERS)
+    try:
+        for stamp, tables, rows in results:
+            with telemetry.span("backfill_load"):
+                counts = upload_rows_to_postgres(*rows, strategy="range") if tables else {}
+                conn = get_db_connection()
+                try:
+                    record_set_done(conn.cursor(), backfill_id, stamp, tables, sum(counts.values()))
+                    conn.commit()
+                finally:
+                    release_db_connection(conn)
+            loaded.append(stamp)
+            row_count += sum(counts.values())
+            telemetry.count("file_sets_loaded")
 
-    for obj in _list_objects(BUCKET, PREFIX):
-        count += 1
-        key = obj["Key"]
-        for name, predicate in WANTS.items():
-            if predicate(key):
-                cur = newest[name]
-                if cur is None or obj["LastModified"] > cur["LastModified"]:
-                    newest[name] = obj
+            elapsed = time.time() - t
+            remaining = len(pending) - len(loaded)
+            print(json.dumps({
+                "msg": "backfill_progress",
+                "backfill_id": backfill_id,
+                "file_set": stamp,
+                "rows": counts,
+                "sets_done": len(loaded),
+                "sets_pending": remaining,
+                "rows_per_s": round(row_count / elapsed) if elapsed else None,
+                "sets_per_min": round(len(loaded) * 60 / elapsed, 2) if elapsed else None,
+                "eta_s": round(elapsed / len(loaded) * remaining),
+            }))
+            if remaining and context is not None and context.get_remaining_time_in_millis() < BACKFILL_STOP_MARGIN_S * 1000:
+                print(json.dumps({"msg": "backfill_yield", "backfill_id": backfill_id, "sets_pending": remaining}))
+                break
+    finally:
+        results.close()
+
+    done = len(loaded) == len(pending)
+    log_checkpoint("backfill_done" if done else "backfill_paused", t0, {"loaded": loaded, "rows": row_count})
+    return {
+        "ok": True,
+        "done": done,
+        "backfill_id": backfill_id,
+        "file_sets": len(stamps),
+        "loaded_sets": loaded,
+        "pending_sets": len(pending) - len(loaded),
+        "row_count": row_count,
+    }
+
+def backfill_handler(event, context):
+    telemetry.reset()
+    print(json.dumps({"msg": "backfill_start", "request_id": context.aws_request_id, **_cold_start_info()}))
+    try:
+        with telemetry.span("backfill"):
+            return run_backfill(event, context)
+    finally:
+        telemetry.emit(Function=os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local"), PipelineMode="backfill")
+
+def handler(event, context):
+    telemetry.reset()
+    try:
+        with telemetry.span("handler"):
+            return _handle(event, context)
+    finally:
+        telemetry.emit(Function=os.getenv("AWS_LAMBDA_FUNCTION_NAME", "local"), PipelineMode=PIPELINE_MODE)
+
+def _handle(event, context):
+    t0 = time.time()
+    print(json.dumps({"msg": "handler_start", "request_id": context.aws_request_id, **_cold_start_info()}))
+    if PIPELINE_MODE == "staged":
+        return run_stages_locally(event)
 
-    log_checkpoint("listed_objects_done", t, {"objects_seen": count})
+    if DEBUG:
+        print(json.dumps({"msg": "list_probe_start", "bucket": BUCKET, "prefix": PREFIX}))
+        probe = s3.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX, MaxKeys=1)
+        print(json.dumps({
+            "msg": "list_probe_done",
+            "key_count": probe.get("KeyCount"),
+            "is_truncated": probe.get("IsTruncated")
+        }))
+
+    t = time.time()
+    with telemetry.span("discover") as sp:
+        newest, count = _discover(BUCKET, PREFIX)
+        sp["objects_seen"] = count
+    log_checkpoint("listed_objects_done", t, {"objects_seen": count, "mode": LIST_MODE})
 
     t = time.time()
     missing = [name for name, obj in newest.items() if obj is None]
@@ -91,26 +642,85 @@ def handler(event, context):
         raise RuntimeError(f"Missing required files in s3://{BUCKET}/{PREFIX or ''}: {missing}")
 
     t = time.time()
-    ccprov1_local = _download(BUCKET, newest["ccprov1"]["Key"])
-    ccprov2_local = _download(BUCKET, newest["ccprov2"]["Key"])
-    ccstaff_local = _download(BUCKET, newest["ccstaff"]["Key"])
-    labor_local = _download(BUCKET, newest["labor"]["Key"])
-    ccschedule1_local = _download(BUCKET, newest["ccschedule1"]["Key"])
-    ccschedule2_local = _download(BUCKET, newest["ccschedule2"]["Key"])
-    ccschedule3_local = _download(BUCKET, newest["ccschedule3"]["Key"])
-    log_checkpoint("downloads_done", t)
+    with telemetry.span("db_connect"):
+        release_db_connection(get_db_connection())
+    log_checkpoint("db_connect_done", t, db_connection_info())
 
     t = time.time()
-    ccprov_csv, ccstaff_csv = clean_ccprov_and_ccstaff(
-        ccprov_paths=[ccprov1_local, ccprov2_local],
-        ccstaff_paths=[ccstaff_local],
-        out_dir="/tmp",
-    )
-    ccschedule_csv, ccschedule_df = clean_ccschedule_files(
-        ccschedule_paths=[ccschedule1_local, ccschedule2_local, ccschedule3_local],
-        out_dir="/tmp",
-        output_filename="ccschedule_merged_clean.csv",
-    )
+    force = bool((event or {}).get("force_refresh"))
+    with telemetry.span("state_check"):
+        tables, sources = _stale_sources(newest, force)
+    log_checkpoint("state_check_done", t, {"stale_tables": tables, "force_refresh": force})
+    picked = {k: v["Key"] for k, v in newest.items()}
+    if not tables:
+        log_checkpoint("handler_done", t0, {"skipped": True})
+        return {"ok": True, "skipped": True, "picked": picked, "merged_csv": None, "row_count": 0}
+
+    _preflight({name: newest[name] for name in sources})
+
+    archived = {}
+    if PIPELINE_MODE == "typed" and CLEAN_ARCHIVE:
+        # Sources archived under their current ETag skip download and parsing.
+        with telemetry.span("archive_lookup") as sp:
+            archived = find_archived({name: newest[name] for name in sources}, SOURCE_KINDS)
+            sp["hits"] = len(archived)
+        sources = [name for name in sources if name not in archived]
+
+    t = time.time()
+    if any(name.startswith("ccschedule") for name in sources):
+        _preload_imports()
+    with telemetry.span("download"):
+        local = _download_all(BUCKET, {name: newest[name] for name in sources})
+    log_checkpoint("downloads_done", t, {"workers": DOWNLOAD_WORKERS, "files": len(local)})
+
+    if PIPELINE_MODE in ("stream", "typed"):
+        t = time.time()
+        with telemetry.span(f"{PIPELINE_MODE}_clean_upload"):
+            if PIPELINE_MODE == "stream":
+                counts = _stream_clean_and_upload(local)
+            else:
+                counts = _typed_clean_and_upload(local, archived, newest)
+        log_checkpoint(f"{PIPELINE_MODE}_clean_upload_done", t, {"rows": counts, "shift_hours_cache": _shift_hours_cache_info()})
+        _record_loaded(newest, tables)
+
+        log_checkpoint("handler_done", t0)
+        return {
+            "ok": True,
+            "picked": picked,
+            "loaded_tables": tables,
+            "merged_csv": None,
+            "row_count": counts.get("app.clinic_ccschedule", 0),
+        }
+
+    t = time.time()
+    with telemetry.span("clean_ccprov_ccstaff"):
+        ccprov_csv, ccstaff_csv = clean_ccprov_and_ccstaff(
+            ccprov_paths=[local[n] for n in ("ccprov1", "ccprov2") if n in local],
+            ccstaff_paths=[local[n] for n in ("ccstaff",) if n in local],
+            out_dir="/tmp",
+        )
+    ccschedule_csv, ccschedule_rows = None, 0
+    schedule_paths = [local[n] for n in ("ccschedule1", "ccschedule2", "ccschedule3") if n in local]
+    if schedule_paths:
+        from pay_ccschedule_clean import SCHEDULE_PARSER, clean_ccschedule_files, write_ccschedule_csv
+
+        with telemetry.span("clean_ccschedule") as sp:
+            if SCHEDULE_PARSER == "stream":
+                # Chunks go straight to the CSV; no merged frame is built.
+                ccschedule_csv, ccschedule_rows = write_ccschedule_csv(
+                    ccschedule_paths=schedule_paths,
+                    out_dir="/tmp",
+                    output_filename="ccschedule_merged_clean.csv",
+                )
+            else:
+                ccschedule_csv, ccschedule_df = clean_ccschedule_files(
+                    ccschedule_paths=schedule_paths,
+                    out_dir="/tmp",
+                    output_filename="ccschedule_merged_clean.csv",
+                )
+                ccschedule_rows = len(ccschedule_df)
+                del ccschedule_df
+            sp["rows"] = ccschedule_rows
     log_checkpoint(
         "clean_done",
         t,
@@ -118,23 +728,30 @@ def handler(event, context):
             "ccprov_csv": ccprov_csv,
             "ccstaff_csv": ccstaff_csv,
             "ccschedule_csv": ccschedule_csv,
-            "ccschedule_row_count": len(ccschedule_df),
+            "ccschedule_row_count": ccschedule_rows,
+            "shift_hours_cache": _shift_hours_cache_info(),
         },
     )
 
     t = time.time()
-    upload_to_postgres(
-        ccprov_csv_path=ccprov_csv,
-        ccstaff_csv_path=ccstaff_csv,
-        labor_xlsx_path=labor_local,
-        ccschedule_csv_path=ccschedule_csv,
-    )
+    with telemetry.span("upload"):
+        upload_to_postgres(
+            ccprov_csv_path=ccprov_csv,
+            ccstaff_csv_path=ccstaff_csv,
+            labor_xlsx_path=local.get("labor"),
+            ccschedule_csv_path=ccschedule_csv,
+        )
     log_checkpoint("upload_done", t)
+    _record_loaded(newest, tables)
 
     log_checkpoint("handler_done", t0)
     return {
         "ok": True,
-        "picked": {k: v["Key"] for k, v in newest.items()},
+        "picked": picked,
+        "loaded_tables": tables,
         "merged_csv": ccschedule_csv,
-        "row_count": len(ccschedule_df),
-    }
\ No newline at end of file
+        "row_count": ccschedule_rows,
+    }
+
+_INIT_S = round(time.perf_counter() - _init_started, 3)
+_cold_start = True
@@ -0,0 +1,213 @@
+import json
+import os
+from datetime import date, timedelta
+
+import telemetry
+
+# Precomputed per-clinic labor aggregates for reports, so they need not join
+# the four loaded tables on every page view. After each successful load the
+# rows for the dates that load touched are deleted and rebuilt in one
+# transaction: readers keep seeing the previous rows until it commits, and
+# dates the load did not touch are left alone. A load that replaced a whole
+# table (truncate, swap) rebuilds everything. Pay periods are the loader's
+# PAY_PERIOD_DAYS-long periods counted from PAY_PERIOD_ANCHOR.
+LABOR_AGGREGATES = os.getenv("LABOR_AGGREGATES", "true").lower() in ("1", "true", "yes")
+
+DAILY_TABLE = "app.clinic_labor_daily"
+PERIOD_TABLE = "app.clinic_labor_pay_period"
+
+# Date column each source table is aggregated by. Labor costs are attributed
+# to the pay period containing their check date.
+_SOURCE_DATES = {
+    "app.clinic_ccschedule": "shift_date",
+    "app.clinic_ccprov": "shift_date",
+    "app.clinic_ccstaff": "shift_date",
+    "app.clinic_labor_costs": "last_check_dt",
+}
+_DAY_COLUMNS = {**_SOURCE_DATES, DAILY_TABLE: "work_date"}
+
+# (aggregate column, source table, expression over a source row, aggregate)
+_DAILY_MEASURES = [
+    ("scheduled_hours", "app.clinic_ccschedule", "shift_hours", "sum"),
+    ("scheduled_shifts", "app.clinic_ccschedule", "(shift_hours > 0)::int", "sum"),
+    ("prov_reg_hours", "app.clinic_ccprov", "reg_hours", "sum"),
+    ("prov_ot_hours", "app.clinic_ccprov", "coalesce(ot1_hours, 0) + coalesce(ot2_hours, 0)", "sum"),
+    ("prov_charge_amount", "app.clinic_ccprov", "total_charge_amount", "sum"),
+    ("prov_pay_amount", "app.clinic_ccprov", "total_pay_amount", "sum"),
+    ("staff_reg_hours", "app.clinic_ccstaff", "reg_hours", "sum"),
+    ("staff_ot_hours", "app.clinic_ccstaff", "coalesce(ot1_hours, 0) + coalesce(ot2_hours, 0)", "sum"),
+    ("staff_charge_amount", "app.clinic_ccstaff", "total_charge_amount", "sum"),
+    ("staff_pay_amount", "app.clinic_ccstaff", "total_pay_amount", "sum"),
+]
+
+_LABOR_MEASURES = [
+    ("labor_employees", "app.clinic_labor_costs", "ee_id", "count_distinct"),
+    ("labor_reg_hours", "app.clinic_labor_costs", "reg_hours", "sum"),
+    ("labor_reg_amount", "app.clinic_labor_costs", "reg_amount", "sum"),
+    ("labor_ot_hours", "app.clinic_labor_costs", "ot_hours", "sum"),
+    ("labor_ot_amount", "app.clinic_labor_costs", "ot_amount", "sum"),
+    ("labor_bonus_amount", "app.clinic_labor_costs", "bonus_amount", "sum"),
+    ("labor_other_amount", "app.clinic_labor_costs", "other_amount", "sum"),
+    ("labor_tax_amount", "app.clinic_labor_costs",
+     "coalesce(suta, 0) + coalesce(futa, 0) + coalesce(ss_tax, 0) + coalesce(mcare_tax, 0) + coalesce(other_tax, 0)",
+     "sum"),
+    ("labor_benefit_amount", "app.clinic_labor_costs",
+     "coalesce(ret_ben, 0) + coalesce(med_ben, 0) + coalesce(dent_ben, 0) + coalesce(vis_ben, 0) + coalesce(oth_ben, 0)",
+     "sum"),
+]
+
+# Pay period rows sum the daily rows of the period, plus the labor costs.
+_PERIOD_MEASURES = [(name, DAILY_TABLE, name, "sum") for name, _, _, _ in _DAILY_MEASURES] + _LABOR_MEASURES
+
+def _column_ddl(measures):
+    return ",\n        ".join(
+        f"{name} {'integer' if agg == 'count_distinct' or name.endswith('_shifts') else 'numeric'} NOT NULL"
+        for name, _, _, agg in measures
+    )
+
+def ensure_aggregate_tables(cursor):
+    """Create the aggregate tables if missing; True when they were just created and need a full build."""
+    cursor.execute("SELECT to_regclass(%s) IS NULL OR to_regclass(%s) IS NULL", (DAILY_TABLE, PERIOD_TABLE))
+    missing = cursor.fetchone()[0]
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        cc1 text,
+        work_date date NOT NULL,
+        {_column_ddl(_DAILY_MEASURES)},
+        refreshed_at timestamptz NOT NULL DEFAULT now()
+    )""")
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS {PERIOD_TABLE} (
+        cc1 text,
+        period_start date NOT NULL,
+        period_end date NOT NULL,
+        {_column_ddl(_PERIOD_MEASURES)},
+        refreshed_at timestamptz NOT NULL DEFAULT now()
+    )""")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS clinic_labor_daily_key ON {DAILY_TABLE} (work_date, cc1)")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS clinic_labor_pay_period_key ON {PERIOD_TABLE} (period_start, cc1)")
+    return missing
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def merge_spans(spans):
+    """
+    One (first, last) covering spans. A span of None stands for the whole
+    table and wins; (None, None) is a load that touched no dated rows.
+    """
+    spans = list(spans)
+    if any(span is None for span in spans):
+        return None
+    firsts = [_as_date(first) for first, _ in spans if first is not None]
+    lasts = [_as_date(last) for _, last in spans if last is not None]
+    if not firsts:
+        return (None, None)
+    return (min(firsts), max(lasts))
+
+def _span_text(span):
+    if span is None:
+        return "all"
+    return None if span[0] is None else [str(span[0]), str(span[1])]
+
+def _period_start(day, anchor, days):
+    return anchor + timedelta(days=(day - anchor).days // days * days)
+
+def _aggregate_sql(expr, agg):
+    if agg == "count_distinct":
+        return f"count(DISTINCT {expr})"
+    return f"coalesce(sum({expr}), 0)"
+
+# Typed NULLs, since UNION ALL resolves a column of bare NULLs as text.
+_NULLS = {"sum": "NULL::numeric", "count_distinct": "NULL::text"}
+
+def _union_sql(measures, day_sql, where):
+    """One UNION ALL branch per source table: cc1, its day and every measure (NULL where not its own)."""
+    branches = []
+    for table_name in dict.fromkeys(table for _, table, _, _ in measures):
+        column = _DAY_COLUMNS[table_name]
+        values = ", ".join(
+            f"{expr if source == table_name else _NULLS[agg]} AS {name}" for name, source, expr, agg in measures
+        )
+        branches.append(f"SELECT cc1, {day_sql(column)} AS day, {values} FROM {table_name} WHERE {where(column)}")
+    return "\n            UNION ALL ".join(branches)
+
+def _where(span):
+    if span is None:
+        return lambda column: f"{column} IS NOT NULL"
+    return lambda column: f"{column} BETWEEN %(first)s AND %(last)s"
+
+def _refresh_daily(cursor, span):
+    names = [name for name, _, _, _ in _DAILY_MEASURES]
+    params = {} if span is None else {"first": span[0], "last": span[1]}
+    cursor.execute(
+        f"DELETE FROM {DAILY_TABLE}" + ("" if span is None else " WHERE work_date BETWEEN %(first)s AND %(last)s"),
+        params,
+    )
+    cursor.execute(
+        f"""INSERT INTO {DAILY_TABLE} (cc1, work_date, {", ".join(names)})
+            SELECT cc1, day, {", ".join(_aggregate_sql(name, agg) for name, _, _, agg in _DAILY_MEASURES)}
+            FROM ({_union_sql(_DAILY_MEASURES, lambda column: column, _where(span))}) u
+            GROUP BY cc1, day""",
+        params,
+    )
+    return cursor.rowcount
+
+def _refresh_periods(cursor, span, anchor, days):
+    names = [name for name, _, _, _ in _PERIOD_MEASURES]
+    params = {"anchor": anchor, "days": days}
+    if span is not None:
+        params.update(first=span[0], last=span[1])
+
+    def _start(column):
+        return f"%(anchor)s::date + floor(({column} - %(anchor)s::date) / %(days)s::numeric)::int * %(days)s"
+
+    cursor.execute(
+        f"DELETE FROM {PERIOD_TABLE}" + ("" if span is None else " WHERE period_start BETWEEN %(first)s AND %(last)s"),
+        params,
+    )
+    cursor.execute(
+        f"""INSERT INTO {PERIOD_TABLE} (cc1, period_start, period_end, {", ".join(names)})
+            SELECT cc1, day, day + %(days)s - 1, {", ".join(_aggregate_sql(name, agg) for name, _, _, agg in _PERIOD_MEASURES)}
+            FROM ({_union_sql(_PERIOD_MEASURES, _start, _where(span))}) u
+            GROUP BY cc1, day""",
+        params,
+    )
+    return cursor.rowcount
+
+def refresh_labor_aggregates(cursor, spans, period_anchor, period_days):
+    """
+    Rebuild the aggregate rows for the dates a load touched, inside the
+    caller's transaction. spans is {table_name: (first, last)} for the tables
+    just loaded, None for a table that was replaced whole. Daily rows follow
+    the schedule and ccprov/ccstaff spans; pay period rows cover every period
+    any span reaches, labor included.
+    Returns {"daily_rows": n, "period_rows": n}.
+    """
+    if ensure_aggregate_tables(cursor):
+        spans = {table_name: None for table_name in _SOURCE_DATES}
+    # Keep a concurrent refresh from interleaving its delete and insert with
+    # this one; readers are not blocked.
+    cursor.execute(f"LOCK TABLE {DAILY_TABLE}, {PERIOD_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+
+    daily_span = merge_spans(span for table_name, span in spans.items() if table_name != "app.clinic_labor_costs")
+    period_span = merge_spans(spans.values())
+    anchor = _as_date(period_anchor)
+    if period_span is not None and period_span[0] is not None:
+        period_span = (
+            _period_start(period_span[0], anchor, period_days),
+            _period_start(period_span[1], anchor, period_days) + timedelta(days=period_days - 1),
+        )
+
+    result = {"daily_rows": 0, "period_rows": 0}
+    if daily_span != (None, None):
+        result["daily_rows"] = _refresh_daily(cursor, daily_span)
+    if period_span != (None, None):
+        result["period_rows"] = _refresh_periods(cursor, period_span, anchor, period_days)
+
+    telemetry.count("aggregate_rows", result["daily_rows"] + result["period_rows"])
+    print(json.dumps({
+        "msg": "labor_aggregates",
+        "daily_span": _span_text(daily_span),
+        "period_span": _span_text(period_span),
+        **result,
+    }))
+    return result
@@ -1,34 +1,31 @@
 import os
 import csv
-from openpyxl import load_workbook
+from functools import partial
 
-def clean_ccprov_and_ccstaff(ccprov_paths, ccstaff_paths, out_dir="/tmp"):
+import telemetry
+from pay_parallel import clean_worker_count, map_ordered
+from workbook_reader import iter_rows
+
+def _read_xlsx_rows(path: str, skiprows: int = 5):
     """
-    ccprov_paths: list[str] local .xlsx paths for ccprov files
-    ccstaff_paths: list[str] local .xlsx paths for ccstaff files
-    returns: (ccprov_csv_path, ccstaff_csv_path)
+    Returns (header, rows_iter) for a ccprov/ccstaff export with the 3rd column
+    dropped. rows_iter is lazy, so the workbook is streamed rather than loaded.
     """
+    # Rows are 1-indexed; first sheet only
+    start_row = skiprows + 1
+    rows_iter = iter_rows(path, min_row=start_row)
 
-    def _read_xlsx_rows(path: str, skiprows: int = 5):
-        # data_only=True uses computed values for formulas (if saved)
-        wb = load_workbook(path, data_only=True, read_only=True)
-        ws = wb.active  # assumes first sheet; adjust if needed
+    # Get header row (first row after skiprows)
+    header = next(rows_iter, None)
+    if header is None:
+        return [], iter(())
 
-        # openpyxl rows are 1-indexed
-        start_row = skiprows + 1
-        rows_iter = ws.iter_rows(min_row=start_row, values_only=True)
+    header = list(header)
+    # Drop 3rd column (index 2) if present
+    if len(header) > 2:
+        header.pop(2)
 
-        # Get header row (first row after skiprows)
-        header = next(rows_iter, None)
-        if header is None:
-            return [], []
-
-        header = list(header)
-        # Drop 3rd column (index 2) if present
-        if len(header) > 2:
-            header.pop(2)
-
-        cleaned_rows = []
+    def _rows():
         for r in rows_iter:
             if r is None:
                 continue
@@ -41,37 +38,122 @@ def clean_ccprov_and_ccstaff(ccprov_paths, ccstaff_paths, out_dir="/tmp"):
             if all(v is None or (isinstance(v, str) and v.strip() == "") for v in row):
                 continue
 
-            cleaned_rows.append(row)
+            yield row
 
-        return header, cleaned_rows
+    return header, _rows()
 
-    def _merge_and_write_csv(paths, out_path):
-        merged_header = None
-        merged_rows = []
+def iter_merged_rows(paths):
+    """
+    Returns (header, rows_iter) over several exports of the same family.
+    Later files are opened lazily and must carry the same header.
+    """
+    paths = list(paths)
+    if not paths:
+        raise ValueError("No data found in provided Excel files")
 
-        for p in paths:
+    merged_header, first_rows = _read_xlsx_rows(paths[0], skiprows=5)
+
+    def _rows():
+        yield from first_rows
+        for p in paths[1:]:
             header, rows = _read_xlsx_rows(p, skiprows=5)
-            if merged_header is None:
-                merged_header = header
-            else:
-                # Basic safety: ensure headers match; if not, still proceed but you can enforce
-                if header != merged_header:
-                    raise ValueError(f"Header mismatch in file {p}")
+            # Basic safety: ensure headers match; if not, still proceed but you can enforce
+            if header != merged_header:
+                raise ValueError(f"Header mismatch in file {p}")
+            yield from rows
 
-            merged_rows.extend(rows)
+    return merged_header, _rows()
 
-        if merged_header is None:
-            raise ValueError("No data found in provided Excel files")
+def _load_xlsx_file(path):
+    # Process-pool worker: returns fully materialized rows so they can be pickled back.
+    header, rows = _read_xlsx_rows(path, skiprows=5)
+    return header, list(rows)
 
-        with open(out_path, "w", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(merged_header)
-            w.writerows(merged_rows)
+def parse_prov_frame(path):
+    """
+    One ccprov/ccstaff export as an object DataFrame with positional columns.
+    Cell values keep their workbook types; the header is in frame.attrs["header"].
+    """
+    import pandas as pd
+
+    header, rows = _load_xlsx_file(path)
+    df = pd.DataFrame(rows, columns=range(len(header)), dtype=object)
+    df.attrs["header"] = header
+    return df
+
+def merge_prov_frames(paths, frames):
+    """Concatenate parsed frames of one family in order, enforcing matching headers."""
+    import pandas as pd
+
+    if not frames:
+        raise ValueError("No data found in provided Excel files")
+    merged_header = frames[0].attrs["header"]
+    for p, df in zip(paths[1:], frames[1:]):
+        if df.attrs["header"] != merged_header:
+            raise ValueError(f"Header mismatch in file {p}")
+    return pd.concat(frames, ignore_index=True)
+
+def _merge_parsed(paths, parsed):
+    """iter_merged_rows over files already parsed by _load_xlsx_file."""
+    paths = list(paths)
+    if not paths:
+        raise ValueError("No data found in provided Excel files")
+
+    merged_header = parsed[paths[0]][0]
+    for p in paths[1:]:
+        if parsed[p][0] != merged_header:
+            raise ValueError(f"Header mismatch in file {p}")
+
+    def _rows():
+        for p in paths:
+            yield from parsed[p][1]
+
+    return merged_header, _rows()
+
+def iter_ccprov_and_ccstaff(ccprov_paths, ccstaff_paths):
+    """
+    Streaming counterpart of clean_ccprov_and_ccstaff: returns (ccprov_rows, ccstaff_rows)
+    iterators, or None for a family passed with no paths.
+    """
+    ccprov_rows = iter_merged_rows(ccprov_paths)[1] if ccprov_paths else None
+    ccstaff_rows = iter_merged_rows(ccstaff_paths)[1] if ccstaff_paths else None
+    return ccprov_rows, ccstaff_rows
+
+def clean_ccprov_and_ccstaff(ccprov_paths, ccstaff_paths, out_dir="/tmp"):
+    """
+    ccprov_paths: list[str] local .xlsx paths for ccprov files
+    ccstaff_paths: list[str] local .xlsx paths for ccstaff files
+    returns: (ccprov_csv_path, ccstaff_csv_path); a family passed with no
+    paths is skipped and its CSV path returned as None
+    """
 
-    ccprov_out = os.path.join(out_dir, "cleaned_clinic_ccprov.csv")
-    ccstaff_out = os.path.join(out_dir, "cleaned_clinic_ccstaff.csv")
+    all_paths = list(ccprov_paths or []) + list(ccstaff_paths or [])
+    if clean_worker_count(len(all_paths)) > 1:
+        with telemetry.span("parse_parallel") as sp:
+            parsed = dict(zip(all_paths, map_ordered(_load_xlsx_file, all_paths)))
+            sp["files"] = len(all_paths)
+        merge = partial(_merge_parsed, parsed=parsed)
+    else:
+        merge = iter_merged_rows
 
-    _merge_and_write_csv(ccprov_paths, ccprov_out)
-    _merge_and_write_csv(ccstaff_paths, ccstaff_out)
+    def _merge_and_write_csv(paths, out_path):
+        if not paths:
+            return None
+        with telemetry.span(f"write_{os.path.basename(out_path)}") as sp:
+            merged_header, rows = merge(paths)
+
+            n = 0
+            with open(out_path, "w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(merged_header)
+                for row in rows:
+                    w.writerow(row)
+                    n += 1
+            sp["rows"] = n
+        telemetry.count("rows_processed", n)
+        return out_path
+
+    ccprov_out = _merge_and_write_csv(ccprov_paths, os.path.join(out_dir, "cleaned_clinic_ccprov.csv"))
+    ccstaff_out = _merge_and_write_csv(ccstaff_paths, os.path.join(out_dir, "cleaned_clinic_ccstaff.csv"))
 
     return ccprov_out, ccstaff_out
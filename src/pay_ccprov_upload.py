@@ -1,11 +1,105 @@
 import csv
+import io
 import json
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import psycopg2
-from openpyxl import load_workbook
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+import telemetry
+
+from pay_aggregates import LABOR_AGGREGATES, refresh_labor_aggregates
+from pay_coerce import coerce_frame, frame_csv
+from pay_schemas import TABLE_SCHEMAS, column_names, column_types
+from workbook_reader import iter_rows
 # from db.easebase_conn import easebase_conn
 
+# Column lists in INSERT order, from the declared schemas in pay_schemas.
+PROV_COLUMNS = column_names("app.clinic_ccprov")
+LABOR_COLUMNS = column_names("app.clinic_labor_costs")
+SCHEDULE_COLUMNS = column_names("app.clinic_ccschedule")
+
+TABLE_COLUMNS = {
+    "app.clinic_ccprov": PROV_COLUMNS,
+    "app.clinic_ccstaff": PROV_COLUMNS,
+    "app.clinic_labor_costs": LABOR_COLUMNS,
+    "app.clinic_ccschedule": SCHEDULE_COLUMNS,
+}
+
+# "copy" streams rows through COPY FROM STDIN into a staging table,
+# "insert" is the original execute_values path kept for comparison.
+UPLOAD_METHOD = os.getenv("UPLOAD_METHOD", "copy")
+COPY_CHUNK_ROWS = int(os.getenv("COPY_CHUNK_ROWS", "50000"))
+
+# "schema" types each chunk column by column from the declared schemas
+# (pay_coerce) before it is sent, so Postgres gets plain numbers, ISO dates
+# and booleans, and a cell that does not convert is loaded as NULL and counted
+# as rejected_cells instead of failing the load. It costs time on the files
+# and stream paths, so it is opt-in. "off" sends rows as they come, leaving
+# the casts to Postgres.
+LOAD_COERCE = os.getenv("LOAD_COERCE", "off")
+
+# "truncate" empties the live tables and reloads them in place.
+# "swap" fills shadow tables and renames them over the live ones, so readers
+# never see a partially loaded table. SWAP_SCOPE picks one transaction per
+# table ("table") or one for all four tables ("all").
+# "diff" stages the new rows, compares them with the live table by natural key
+# and row hash, and applies only the inserts, updates and deletes. Like "swap"
+# it always stages through COPY, whatever UPLOAD_METHOD says.
+# "partition" replaces only the partitions of a range-partitioned table that
+# the incoming rows cover; tables that are not partitioned are truncated.
+# "range" deletes the live rows dated between the earliest and latest incoming
+# date and inserts the new ones, so loading an older period leaves the rest of
+# the table alone and reloading the same period is idempotent.
+LOAD_STRATEGY = os.getenv("LOAD_STRATEGY", "truncate")
+SWAP_SCOPE = os.getenv("SWAP_SCOPE", "all")
+SWAP_LOCK_TIMEOUT = os.getenv("SWAP_LOCK_TIMEOUT", "10s")
+
+# Natural keys for LOAD_STRATEGY=diff. They need not be unique: rows sharing
+# a key are matched with identical live rows first and the rest paired up in
+# hash order, so duplicates still diff correctly.
+TABLE_KEYS = {
+    "app.clinic_ccprov": ("ee_id", "shift_date", "time_in"),
+    "app.clinic_ccstaff": ("ee_id", "shift_date", "time_in"),
+    "app.clinic_labor_costs": ("company", "ee_id", "last_check_dt", "cc1", "cc2"),
+    "app.clinic_ccschedule": ("employee_number", "shift_date"),
+}
+
+# Date column per table: the range partition key for LOAD_STRATEGY=partition
+# and the replaced period for LOAD_STRATEGY=range. Partitions are named <table>_pYYYYMMDD after their first day and created on demand, one per
+# calendar month or per PAY_PERIOD_DAYS-long pay period counted from
+# PAY_PERIOD_ANCHOR. Rows with no date go to <table>_pdefault.
+PARTITION_COLUMNS = {
+    "app.clinic_ccprov": "shift_date",
+    "app.clinic_ccstaff": "shift_date",
+    "app.clinic_labor_costs": "last_check_dt",
+    "app.clinic_ccschedule": "shift_date",
+}
+PARTITION_GRAIN = os.getenv("PARTITION_GRAIN", "month")
+PAY_PERIOD_ANCHOR = os.getenv("PAY_PERIOD_ANCHOR", "2025-01-05")
+PAY_PERIOD_DAYS = int(os.getenv("PAY_PERIOD_DAYS", "14"))
+
+# Keep one connection alive between warm invocations instead of paying the
+# TLS handshake every run. DB_REUSE_CONNECTION=false opens a fresh one per call.
+DB_REUSE_CONNECTION = os.getenv("DB_REUSE_CONNECTION", "true").lower() in ("1", "true", "yes")
+DB_KEEPALIVES = os.getenv("DB_KEEPALIVES", "true").lower() in ("1", "true", "yes")
+
+# "parallel" loads each table on its own pooled connection. truncate and swap
+# fill shadow tables in parallel and move them in with one short transaction;
+# diff, partition and range work in place and commit together at the end,
+# which DB_TWO_PHASE makes atomic with PREPARE TRANSACTION.
+LOAD_CONCURRENCY = os.getenv("LOAD_CONCURRENCY", "serial")
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+DB_TWO_PHASE = os.getenv("DB_TWO_PHASE", "false").lower() in ("1", "true", "yes")
+
+_conn = None
+_load_pool = None
+_connection_info = {"warm": False, "setup_s": None}
+
 def _noneify(v):
     # Convert blanks to None; keep numbers/dates as-is
     if v is None:
@@ -14,149 +108,877 @@ def _noneify(v):
         return None
     return v
 
+class _CountingCursor(psycopg2.extensions.cursor):
+    """Counts statements sent to the server as db_round_trips."""
+
+    def execute(self, query, vars=None):
+        telemetry.count("db_round_trips")
+        return super().execute(query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        telemetry.count("db_round_trips")
+        return super().copy_expert(sql, file, size)
+
+def _db_credentials():
+    # Parsed on each connect (a local env var, so there is nothing to cache);
+    # rotated values set on the function are picked up by the next connection.
+    return json.loads(os.getenv("DB_CREDENTIALS"))
+
+def _connect_kwargs():
+    db_credentials = _db_credentials()
+    kwargs = dict(
+        dbname=db_credentials["database"],
+        user=db_credentials["user"],
+        password=db_credentials["password"],
+        host=db_credentials["host"],
+        port=db_credentials["port"],
+        cursor_factory=_CountingCursor,
+    )
+    if DB_KEEPALIVES:
+        kwargs.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    return kwargs
+
+def _connect():
+    return psycopg2.connect(**_connect_kwargs())
+
+def _is_healthy(conn):
+    if conn is None or conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
 def get_db_connection():
+    """
+    Returns a connection. With DB_REUSE_CONNECTION (the default) the same
+    connection is kept at module level and handed out again on warm
+    invocations after a SELECT 1 health check; a dead one is replaced.
+    Hand it back with release_db_connection rather than closing it.
+    """
+    global _conn
+    t = time.time()
     try:
-        db_credentials = json.loads(os.getenv("DB_CREDENTIALS"))  # Retrieve and parse DB credentials
-        conn = psycopg2.connect(
-            dbname=db_credentials["database"],
-            user=db_credentials["user"],
-            password=db_credentials["password"],
-            host=db_credentials["host"],
-            port=db_credentials["port"]
-        )
+        if DB_REUSE_CONNECTION and _is_healthy(_conn):
+            _connection_info.update({"warm": True, "setup_s": round(time.time() - t, 3)})
+            return _conn
+
+        if _conn is not None and not _conn.closed:
+            _conn.close()
+        _conn = None
+        conn = _connect()
+        _connection_info.update({"warm": False, "setup_s": round(time.time() - t, 3)})
+        if DB_REUSE_CONNECTION:
+            _conn = conn
         return conn
     except Exception as e:
         print(f"🚨 Database connection error: {e}")
         raise
 
-def _read_csv_rows(path):
+def release_db_connection(conn):
+    """Roll back anything uncommitted; close the connection unless it is the shared one."""
+    global _conn
+    if conn.closed:
+        if conn is _conn:
+            _conn = None
+        return
+    try:
+        conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+        if conn is _conn:
+            _conn = None
+        return
+    if conn is not _conn:
+        conn.close()
+
+def db_connection_info():
+    """{"warm": bool, "setup_s": float} for the last get_db_connection call."""
+    return dict(_connection_info)
+
+def iter_csv_rows(path):
+    """Yield data rows of a cleaned CSV, skipping the header."""
     with open(path, newline="", encoding="utf-8") as f:
         r = csv.reader(f)
-        header = next(r, None)
-        if header is None:
-            return [], []
-        rows = []
+        next(r, None)
         for row in r:
-            rows.append([_noneify(v) for v in row])
-        return header, rows
-
-def _read_xlsx_rows(path, header_row=1):
-    wb = load_workbook(path, data_only=True, read_only=True)
-    ws = wb.active
+            yield [_noneify(v) for v in row]
 
-    # Read header
-    header = [c.value for c in ws[header_row]]
-    rows = []
-    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+def iter_xlsx_rows(path, header_row=1):
+    """Yield data rows after header_row without materializing the sheet."""
+    for row in iter_rows(path, min_row=header_row + 1):
         # skip empty rows
         if row is None:
             continue
         if all(v is None or (isinstance(v, str) and v.strip() == "") for v in row):
             continue
-        rows.append([_noneify(v) for v in row])
-    return header, rows
+        yield [_noneify(v) for v in row]
 
-def upload_to_postgres(ccprov_csv_path, ccstaff_csv_path, labor_xlsx_path, ccschedule_csv_path):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def read_labor_frame(path, header_row=1):
+    """The labor export as an object DataFrame, keeping workbook value types."""
+    import pandas as pd
 
-    table_name = 'app.clinic_ccprov'
-    lab_table_name = 'app.clinic_labor_costs'
-    staff_table_name = 'app.clinic_ccstaff'
-    schedule_table_name = 'app.clinic_ccschedule'
-    
+    header = list(next(iter_rows(path, min_row=header_row), ()))
+    df = pd.DataFrame(list(iter_xlsx_rows(path, header_row=header_row)), dtype=object)
+    df.attrs["header"] = header
+    return df
 
-    cursor.execute('truncate app.clinic_ccprov')
-    cursor.execute('truncate app.clinic_ccstaff')
-    cursor.execute('truncate app.clinic_labor_costs')
-    cursor.execute('truncate app.clinic_ccschedule')
-    conn.commit()
+def frame_rows(df):
+    """Yield a DataFrame's rows as tuples with missing values as None, for the loaders."""
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
 
-    batch_size = 100
+def _load_types(table_name):
+    """Declared column types for table_name or its shadow, or None when LOAD_COERCE is off."""
+    if LOAD_COERCE == "off":
+        return None
+    if LOAD_COERCE != "schema":
+        raise ValueError(f"Unknown LOAD_COERCE: {LOAD_COERCE}")
+    base = table_name[:-len("_shadow")] if table_name.endswith("_shadow") else table_name
+    return column_types(base) if base in TABLE_SCHEMAS else None
+
+def _coerced_rows(table_name, columns, rows, chunk_rows=None):
+    """rows typed by coerce_frame a chunk at a time, as tuples with None for missing values."""
+    types = _load_types(table_name)
+    if types is None:
+        yield from rows
+        return
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows or COPY_CHUNK_ROWS))
+        if not chunk:
+            return
+        yield from frame_rows(coerce_frame(chunk, columns, types, table_name))
 
-    # ccprov
-    _, ccprov_rows = _read_csv_rows(ccprov_csv_path)
+def _insert_rows(conn, cursor, table_name, columns, rows, batch_size=100):
+    """Original load path: execute_values in small batches, commit per batch."""
+    rows = _coerced_rows(table_name, columns, rows)
     insert_query = f"""INSERT INTO {table_name} (
-        ee_id, employee_name, shift_date, day, pay_type, reg_hours, ot1_hours, ot2_hours,
-        unpaid_hours, time_in, time_out, cc1, cc2, reg_charge_rate, ot_charge_rate,
-        reg_charge_amount, ot_charge_amount, total_charge_amount, reg_pay_rate, ot_pay_rate,
-        reg_paid, ot_paid, total_pay_amount
+        {", ".join(columns)}
     ) VALUES %s ON CONFLICT DO NOTHING;"""
 
+    count = 0
     buf = []
-    for row in ccprov_rows:
+    for row in rows:
         buf.append(tuple(row))
         if len(buf) == batch_size:
             execute_values(cursor, insert_query, buf)
             conn.commit()
+            count += len(buf)
             buf = []
     if buf:
         execute_values(cursor, insert_query, buf)
         conn.commit()
+        count += len(buf)
+    return count
 
-    # ccstaff
-    _, ccstaff_rows = _read_csv_rows(ccstaff_csv_path)
-    staff_insert_query = f"""INSERT INTO {staff_table_name} (
-        ee_id, employee_name, shift_date, day, pay_type, reg_hours, ot1_hours, ot2_hours,
-        unpaid_hours, time_in, time_out, cc1, cc2, reg_charge_rate, ot_charge_rate,
-        reg_charge_amount, ot_charge_amount, total_charge_amount, reg_pay_rate, ot_pay_rate,
-        reg_paid, ot_paid, total_pay_amount
-    ) VALUES %s ON CONFLICT DO NOTHING;"""
+def _copy_chunk(cursor, staging, columns, rows, types=None, label=None):
+    # csv.writer and to_csv render None/NaN as an unquoted empty field, which COPY reads as NULL.
+    buf = io.StringIO()
+    if types:
+        frame_csv(coerce_frame(rows, columns, types, label), buf)
+    else:
+        csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY {staging} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+def _stage_rows(cursor, table_name, columns, rows, chunk_rows=None):
+    """COPY rows into a temp table shaped like table_name. Returns (staging_name, rows)."""
+    chunk_rows = chunk_rows or COPY_CHUNK_ROWS
+    staging = "stage_" + table_name.split(".")[-1]
+    cols = ", ".join(columns)
+
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+        f"SELECT {cols} FROM {table_name} WITH NO DATA"
+    )
 
+    types = _load_types(table_name)
+    count = 0
     buf = []
-    for row in ccstaff_rows:
-        buf.append(tuple(row))
-        if len(buf) == batch_size:
-            execute_values(cursor, staff_insert_query, buf)
-            conn.commit()
+    for row in rows:
+        buf.append(row)
+        if len(buf) == chunk_rows:
+            _copy_chunk(cursor, staging, columns, buf, types, table_name)
+            count += len(buf)
             buf = []
     if buf:
-        execute_values(cursor, staff_insert_query, buf)
-        conn.commit()
+        _copy_chunk(cursor, staging, columns, buf, types, table_name)
+        count += len(buf)
+    return staging, count
 
-    # labor (xlsx)
-    _, labor_rows = _read_xlsx_rows(labor_xlsx_path, header_row=1)
-    lab_insert_query = f"""INSERT INTO {lab_table_name} (
-        company, ee_id, cntlast, cntfirst, cntdept, cndarea, last_check_dt, cc1, cc2,
-        reg_hours, reg_amount, ot_hours, ot_amount, bonus_amount, other_amount,
-        suta, futa, ss_tax, mcare_tax, other_tax, ret_ben, med_ben, dent_ben, vis_ben, oth_ben
-    ) VALUES %s ON CONFLICT DO NOTHING;"""
+def _copy_rows(cursor, table_name, columns, rows, chunk_rows=None):
+    """
+    Bulk load rows into table_name with COPY FROM STDIN.
 
-    buf = []
-    for row in labor_rows:
-        buf.append(tuple(row))
-        if len(buf) == batch_size:
-            execute_values(cursor, lab_insert_query, buf)
+    Rows are streamed into a temp staging table in chunks of chunk_rows, then
+    moved into the target with one INSERT ... SELECT so ON CONFLICT DO NOTHING
+    still applies. The caller owns the transaction.
+    """
+    staging, count = _stage_rows(cursor, table_name, columns, rows, chunk_rows)
+    cols = ", ".join(columns)
+    cursor.execute(
+        f"INSERT INTO {table_name} ({cols}) SELECT {cols} FROM {staging} ON CONFLICT DO NOTHING"
+    )
+    return count
+
+def _apply_diff(cursor, table_name, staging, columns, keys, date_column=None):
+    """
+    Make table_name match staging by touching only the rows that differ.
+
+    Both sides are hashed per row (md5 of the column tuple). Identical rows
+    are paired first, copy for copy, and left alone; the remaining rows of
+    each natural key are then paired in hash order, so duplicate-key rows
+    that did not change never pair with ones that did. A remaining pair
+    becomes an UPDATE, an unpaired staged row an INSERT and an unpaired live
+    row a DELETE. Live rows are addressed by ctid, so the table needs no
+    primary key. The caller owns the transaction.
+    Returns ({"inserted": n, "updated": n, "deleted": n}, dates), dates being
+    the (first, last) date_column value among the old and new versions of
+    the changed rows.
+    """
+    diff = "diff_" + table_name.split(".")[-1]
+    cols = ", ".join(columns)
+    row_hash = f"md5(row({cols})::text)"
+    key_hash = f"md5(row({', '.join(keys)})::text)"
+
+    def _unpaired(side, other):
+        # Rows of side without an identical copy in other, numbered per key.
+        return f"""SELECT {side}.*, row_number() OVER (
+                       PARTITION BY {side}.key_hash ORDER BY {side}.row_hash, {side}.dup) AS rn
+                   FROM {side} WHERE NOT EXISTS (
+                       SELECT 1 FROM {other} o WHERE o.key_hash = {side}.key_hash
+                       AND o.row_hash = {side}.row_hash AND o.dup = {side}.dup)"""
+
+    # Keep writers out while the diff is computed and applied; readers are not blocked.
+    cursor.execute(f"LOCK TABLE {table_name} IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(f"ANALYZE {staging}")
+    cursor.execute(f"DROP TABLE IF EXISTS {diff}")
+    cursor.execute(f"""
+        CREATE TEMP TABLE {diff} ON COMMIT DROP AS
+        WITH s AS (
+            SELECT {cols}, {row_hash} AS row_hash, {key_hash} AS key_hash,
+                   row_number() OVER (PARTITION BY {key_hash}, {row_hash}) AS dup
+            FROM {staging}
+        ), t AS (
+            SELECT ctid AS row_ctid, {row_hash} AS row_hash, {key_hash} AS key_hash,
+                   row_number() OVER (PARTITION BY {key_hash}, {row_hash}) AS dup
+            FROM {table_name}
+        ), s_left AS ({_unpaired("s", "t")}
+        ), t_left AS ({_unpaired("t", "s")}
+        )
+        SELECT t.row_ctid, {", ".join(f"s.{c}" for c in columns)},
+               CASE WHEN t.row_ctid IS NULL THEN 'insert'
+                    WHEN s.row_hash IS NULL THEN 'delete'
+                    ELSE 'update' END AS action
+        FROM s_left s FULL JOIN t_left t ON s.key_hash = t.key_hash AND s.rn = t.rn
+    """)
+
+    dates = None
+    if date_column:
+        # Before anything is applied, while the ctids still address the old rows.
+        cursor.execute(
+            f"SELECT least(min(d.{date_column}), min(t.{date_column})), "
+            f"greatest(max(d.{date_column}), max(t.{date_column})) "
+            f"FROM {diff} d LEFT JOIN {table_name} t ON t.ctid = d.row_ctid"
+        )
+        dates = _span(*cursor.fetchone())
+
+    changes = {}
+    cursor.execute(
+        f"DELETE FROM {table_name} t USING {diff} d WHERE d.action = 'delete' AND t.ctid = d.row_ctid"
+    )
+    changes["deleted"] = cursor.rowcount
+    cursor.execute(
+        f"UPDATE {table_name} t SET ({cols}) = ({', '.join(f'd.{c}' for c in columns)}) "
+        f"FROM {diff} d WHERE d.action = 'update' AND t.ctid = d.row_ctid"
+    )
+    changes["updated"] = cursor.rowcount
+    cursor.execute(
+        f"INSERT INTO {table_name} ({cols}) SELECT {cols} FROM {diff} WHERE action = 'insert' "
+        f"ON CONFLICT DO NOTHING"
+    )
+    changes["inserted"] = cursor.rowcount
+    return changes, dates
+
+def _diff_rows(cursor, table_name, columns, rows):
+    staging, count = _stage_rows(cursor, table_name, columns, rows)
+    changes, dates = _apply_diff(
+        cursor, table_name, staging, columns, TABLE_KEYS[table_name], PARTITION_COLUMNS[table_name]
+    )
+    return count, changes, dates
+
+def _load_table(conn, cursor, table_name, columns, rows, method=None):
+    method = method or UPLOAD_METHOD
+    if method == "insert":
+        return _insert_rows(conn, cursor, table_name, columns, rows)
+    if method != "copy":
+        raise ValueError(f"Unknown UPLOAD_METHOD: {method}")
+    count = _copy_rows(cursor, table_name, columns, rows)
+    conn.commit()
+    return count
+
+def _shadow_name(table_name):
+    return f"{table_name}_shadow"
+
+def _prepare_shadow(cursor, table_name):
+    shadow = _shadow_name(table_name)
+    cursor.execute(f"DROP TABLE IF EXISTS {shadow}")
+    cursor.execute(f"CREATE TABLE {shadow} (LIKE {table_name} INCLUDING ALL)")
+    return shadow
+
+def _copy_grants(cursor, src, dst):
+    # LIKE does not carry privileges; re-grant so dashboard roles keep access after the swap.
+    schema, name = src.split(".")
+    cursor.execute(
+        """SELECT grantee, privilege_type FROM information_schema.role_table_grants
+           WHERE table_schema = %s AND table_name = %s AND grantee <> current_user""",
+        (schema, name),
+    )
+    for grantee, privilege in cursor.fetchall():
+        role = grantee if grantee == "PUBLIC" else f'"{grantee}"'
+        cursor.execute(f"GRANT {privilege} ON {dst} TO {role}")
+
+def _dependent_views(cursor, table_name):
+    """Views and materialized views that read table_name."""
+    cursor.execute(
+        """SELECT DISTINCT v.oid::regclass::text FROM pg_depend d
+           JOIN pg_rewrite r ON r.oid = d.objid
+           JOIN pg_class v ON v.oid = r.ev_class
+           WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = %s::regclass AND v.oid <> d.refobjid
+           ORDER BY 1""",
+        (table_name,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _swap_in(cursor, table_name):
+    """
+    Replace table_name with its filled shadow using renames inside the caller's
+    transaction. A table that views read cannot be renamed away and dropped
+    (the views follow the old table), so its rows are replaced from the shadow
+    in place instead; readers still see the old rows until the commit.
+    """
+    schema, name = table_name.split(".")
+    shadow = _shadow_name(table_name)
+    # Fail fast instead of queueing behind long-running readers; the load can be retried.
+    cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+    views = _dependent_views(cursor, table_name)
+    if views:
+        print(json.dumps({"msg": "swap_in_place", "table": table_name, "views": views}))
+        cursor.execute(f"DELETE FROM {table_name}")
+        cursor.execute(f"INSERT INTO {table_name} SELECT * FROM {shadow}")
+        cursor.execute(f"DROP TABLE {shadow}")
+        return
+    _copy_grants(cursor, table_name, shadow)
+    cursor.execute(f"ALTER TABLE {table_name} RENAME TO {name}_old")
+    cursor.execute(f"ALTER TABLE {shadow} RENAME TO {name}")
+    cursor.execute(f"DROP TABLE {schema}.{name}_old")
+
+def _is_partitioned(cursor, table_name):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (table_name,))
+    return cursor.fetchone() is not None
+
+def _partition_ranges(cursor, staging, column, grain=None):
+    """Distinct [start, end) partition ranges covering the non-null dates in staging."""
+    grain = grain or PARTITION_GRAIN
+    if grain == "month":
+        start = f"date_trunc('month', {column})::date"
+        cursor.execute(
+            f"SELECT DISTINCT {start}, ({start} + interval '1 month')::date "
+            f"FROM {staging} WHERE {column} IS NOT NULL ORDER BY 1"
+        )
+    elif grain == "pay_period":
+        start = f"%(anchor)s::date + floor(({column} - %(anchor)s::date) / %(days)s::numeric)::int * %(days)s"
+        cursor.execute(
+            f"SELECT DISTINCT {start}, {start} + %(days)s "
+            f"FROM {staging} WHERE {column} IS NOT NULL ORDER BY 1",
+            {"anchor": PAY_PERIOD_ANCHOR, "days": PAY_PERIOD_DAYS},
+        )
+    else:
+        raise ValueError(f"Unknown PARTITION_GRAIN: {grain}")
+    return cursor.fetchall()
+
+def _replace_partition(cursor, table_name, staging, columns, column, bounds, span=None):
+    """
+    Build the partition for bounds ((start, end), or None for the default
+    partition) from staging as a standalone table, then detach and drop the old
+    one and attach the new one in its place. Rows of the old partition dated
+    outside span (the incoming (first, last) dates) are carried over, so a
+    file covering part of a partition replaces only that part; old undated
+    rows are kept unless the load carries an identical one, as with
+    LOAD_STRATEGY=range. Returns the staged rows written.
+    """
+    schema, name = table_name.split(".")
+    part = f"{name}_pdefault" if bounds is None else f"{name}_p{bounds[0]:%Y%m%d}"
+    old = f"{schema}.{part}"
+    new = f"{old}_new"
+    cols = ", ".join(columns)
+
+    cursor.execute(f"DROP TABLE IF EXISTS {new}")
+    cursor.execute(f"CREATE TABLE {new} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    if bounds is None:
+        cursor.execute(f"INSERT INTO {new} ({cols}) SELECT {cols} FROM {staging} WHERE {column} IS NULL")
+    else:
+        cursor.execute(
+            f"INSERT INTO {new} ({cols}) SELECT {cols} FROM {staging} WHERE {column} >= %s AND {column} < %s",
+            bounds,
+        )
+    count = cursor.rowcount
+
+    cursor.execute("SELECT to_regclass(%s)", (old,))
+    if cursor.fetchone()[0] is not None:
+        if bounds is None:
+            old_cols = ", ".join(f"o.{c}" for c in columns)
+            staged_cols = ", ".join(f"s.{c}" for c in columns)
+            cursor.execute(
+                f"""INSERT INTO {new} ({cols}) SELECT {old_cols} FROM {old} o WHERE NOT EXISTS (
+                        SELECT 1 FROM {staging} s
+                        WHERE s.{column} IS NULL AND ({staged_cols}) IS NOT DISTINCT FROM ({old_cols}))"""
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {new} ({cols}) SELECT {cols} FROM {old} WHERE {column} < %s OR {column} > %s",
+                span,
+            )
+        telemetry.count("partition_rows_kept", cursor.rowcount)
+        cursor.execute(f"ALTER TABLE {table_name} DETACH PARTITION {schema}.{part}")
+        cursor.execute(f"DROP TABLE {schema}.{part}")
+    cursor.execute(f"ALTER TABLE {new} RENAME TO {part}")
+    if bounds is None:
+        cursor.execute(f"ALTER TABLE {table_name} ATTACH PARTITION {schema}.{part} DEFAULT")
+    else:
+        cursor.execute(
+            f"ALTER TABLE {table_name} ATTACH PARTITION {schema}.{part} FOR VALUES FROM (%s) TO (%s)",
+            tuple(b.isoformat() for b in bounds),
+        )
+    return count
+
+def _partition_rows(cursor, table_name, columns, rows):
+    """
+    Replace the rows of table_name dated within the span of rows' dates by
+    rebuilding the partitions that span reaches; live rows outside the span
+    are carried into the rebuilt partitions, and other partitions are left as
+    they were. The default partition (rows with no date) is only rebuilt when
+    the load carries undated rows. The caller owns the transaction.
+    Returns (rows, dates replaced).
+    """
+    if not _is_partitioned(cursor, table_name):
+        print(json.dumps({"msg": "partition_load_fallback", "table": table_name, "reason": "not partitioned"}))
+        cursor.execute(f"truncate {table_name}")
+        return _copy_rows(cursor, table_name, columns, rows), None
+
+    column = PARTITION_COLUMNS[table_name]
+    staging, count = _stage_rows(cursor, table_name, columns, rows)
+    # DETACH and ATTACH lock the parent; fail fast like the swap does.
+    cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+    cursor.execute(f"SELECT min({column}), max({column}), bool_or({column} IS NULL) FROM {staging}")
+    low, high, undated = cursor.fetchone()
+    # The default partition goes first: attaching a range partition scans it.
+    if undated:
+        _replace_partition(cursor, table_name, staging, columns, column, None)
+    ranges = _partition_ranges(cursor, staging, column)
+    for bounds in ranges:
+        _replace_partition(cursor, table_name, staging, columns, column, bounds, (low, high))
+    telemetry.count("partitions_replaced", len(ranges))
+    return count, _span(low, high)
+
+def _range_rows(cursor, table_name, columns, rows):
+    """
+    Replace the rows of table_name dated within the span of rows' dates. Rows
+    with no date replace identical undated rows, so a rerun does not duplicate
+    them. The caller owns the transaction. Returns (rows, dates replaced).
+    """
+    column = PARTITION_COLUMNS[table_name]
+    staging, count = _stage_rows(cursor, table_name, columns, rows)
+    cursor.execute(f"SELECT min({column}), max({column}) FROM {staging}")
+    low, high = cursor.fetchone()
+    if low is not None:
+        cursor.execute(f"DELETE FROM {table_name} WHERE {column} BETWEEN %s AND %s", (low, high))
+        telemetry.count("rows_replaced", cursor.rowcount)
+    target_cols = ", ".join(f"t.{c}" for c in columns)
+    staged_cols = ", ".join(f"s.{c}" for c in columns)
+    cursor.execute(
+        f"""DELETE FROM {table_name} t WHERE t.{column} IS NULL AND EXISTS (
+                SELECT 1 FROM {staging} s
+                WHERE s.{column} IS NULL AND ({staged_cols}) IS NOT DISTINCT FROM ({target_cols}))"""
+    )
+    col_list = ", ".join(columns)
+    cursor.execute(
+        f"INSERT INTO {table_name} ({col_list}) SELECT {col_list} FROM {staging} ON CONFLICT DO NOTHING"
+    )
+    return count, _span(low, high)
+
+def _stage_tag(run_id):
+    return f"paylocity-run:{run_id}"
+
+def stage_shadow(table_name, rows, run_id):
+    """
+    Fill table_name's shadow from rows on a pooled connection and commit it,
+    tagged with run_id, so another invocation can swap it in later with
+    swap_staged. Returns the rows loaded.
+    """
+    conn = _pool_connection()
+    cursor = conn.cursor()
+    try:
+        with telemetry.span(f"load_{table_name}") as sp:
+            shadow = _prepare_shadow(cursor, table_name)
+            count = sp["rows"] = _copy_rows(cursor, shadow, TABLE_COLUMNS[table_name], rows)
+            cursor.execute(f"COMMENT ON TABLE {shadow} IS %s", (_stage_tag(run_id),))
             conn.commit()
-            buf = []
-    if buf:
-        execute_values(cursor, lab_insert_query, buf)
-        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        _load_pool.putconn(conn, close=bool(conn.closed))
+    telemetry.count("rows_loaded", count)
+    return count
 
-    # ccschedule
-    _, ccschedule_rows = _read_csv_rows(ccschedule_csv_path)
-    schedule_insert_query = f"""INSERT INTO {schedule_table_name} (
-        cc1,
-        employee_name,
-        employee_number,
-        shift_date,
-        shift_day,
-        shift,
-        shift_hours,
-        manual_attendance,
-        manual_attendance_points
-    ) VALUES %s ON CONFLICT DO NOTHING;"""
+def swap_staged(cursor, table_names, run_id):
+    """
+    Swap in the shadows stage_shadow filled for run_id, inside the caller's
+    transaction. A shadow left by another run is refused rather than swapped.
+    """
+    for table_name in table_names:
+        shadow = _shadow_name(table_name)
+        cursor.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (shadow,))
+        row = cursor.fetchone()
+        if row is None or row[0] != _stage_tag(run_id):
+            raise RuntimeError(f"{shadow} was not staged by run {run_id}")
+        _swap_in(cursor, table_name)
 
-    buf = []
-    for row in ccschedule_rows:
-        buf.append(tuple(row))
-        if len(buf) == batch_size:
-            execute_values(cursor, schedule_insert_query, buf)
+def _span(first, last):
+    # ISO dates, so the span can go straight into the JSON metrics.
+    return (str(first), str(last)) if first is not None else (None, None)
+
+def _record_metric(metrics, table_name, rows, start, changes=None, dates=None):
+    """dates is the (first, last) date span the load touched; None when the whole table was replaced."""
+    elapsed = time.time() - start
+    metrics[table_name] = {
+        "rows": rows,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed) if elapsed else None,
+        "dates": dates,
+    }
+    telemetry.count("rows_loaded", rows)
+    if changes is not None:
+        metrics[table_name].update(changes)
+        telemetry.count("rows_changed", sum(changes.values()))
+
+def _load_truncate(conn, cursor, loads, metrics):
+    """
+    Truncate and reload each table in its own transaction, committed once its
+    rows are exhausted, so a source that fails mid-parse (rows are often lazy
+    generators) leaves that table's previous contents in place. Readers of a
+    table wait on the truncate's lock while it loads. UPLOAD_METHOD=insert
+    commits per batch and so cannot keep that guarantee.
+    """
+    for table_name, columns, rows in loads:
+        t = time.time()
+        try:
+            with telemetry.span(f"load_{table_name}") as sp:
+                cursor.execute(f"truncate {table_name}")
+                count = sp["rows"] = _load_table(conn, cursor, table_name, columns, rows)
+        except Exception:
+            conn.rollback()
+            raise
+        _record_metric(metrics, table_name, count, t)
+
+def _load_swap(conn, cursor, loads, metrics, scope=None):
+    """
+    Fill a shadow copy of each table while readers keep using the live one, then
+    swap it in by rename. scope="table" commits each table's swap on its own,
+    scope="all" loads and swaps every table in a single transaction.
+    """
+    scope = scope or SWAP_SCOPE
+    if scope not in ("table", "all"):
+        raise ValueError(f"Unknown SWAP_SCOPE: {scope}")
+
+    try:
+        for table_name, columns, rows in loads:
+            t = time.time()
+            with telemetry.span(f"load_{table_name}") as sp:
+                shadow = _prepare_shadow(cursor, table_name)
+                count = sp["rows"] = _copy_rows(cursor, shadow, columns, rows)
+                if scope == "table":
+                    _swap_in(cursor, table_name)
+                    conn.commit()
+            _record_metric(metrics, table_name, count, t)
+
+        if scope == "all":
+            for table_name, _, _ in loads:
+                _swap_in(cursor, table_name)
             conn.commit()
-            buf = []
-    if buf:
-        execute_values(cursor, schedule_insert_query, buf)
+    except Exception:
+        conn.rollback()
+        raise
+
+def _load_diff(conn, cursor, loads, metrics):
+    """Apply each table's delta in its own transaction."""
+    for table_name, columns, rows in loads:
+        t = time.time()
+        try:
+            with telemetry.span(f"load_{table_name}") as sp:
+                count, changes, dates = _diff_rows(cursor, table_name, columns, rows)
+                sp["rows"] = count
+                sp.update(changes)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        _record_metric(metrics, table_name, count, t, changes, dates)
+
+def _load_each(conn, cursor, loads, metrics, load_fn):
+    """Load each table with load_fn (the partition or range replacement) in its own transaction."""
+    for table_name, columns, rows in loads:
+        t = time.time()
+        try:
+            with telemetry.span(f"load_{table_name}") as sp:
+                count, dates = load_fn(cursor, table_name, columns, rows)
+                sp["rows"] = count
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        _record_metric(metrics, table_name, count, t, dates=dates)
+
+def _load_one_uncommitted(conn, load, strategy):
+    """
+    One table's load on its own connection, left open for the coordinated
+    commit. truncate and swap only fill the table's shadow here, leaving the
+    live table unlocked; _move_in_shadows replaces it afterwards.
+    """
+    table_name, columns, rows = load
+    cursor = conn.cursor()
+    changes = dates = None
+    try:
+        if strategy in ("swap", "truncate"):
+            shadow = _prepare_shadow(cursor, table_name)
+            count = _copy_rows(cursor, shadow, columns, rows)
+        elif strategy == "diff":
+            count, changes, dates = _diff_rows(cursor, table_name, columns, rows)
+        elif strategy == "partition":
+            count, dates = _partition_rows(cursor, table_name, columns, rows)
+        else:
+            count, dates = _range_rows(cursor, table_name, columns, rows)
+    finally:
+        cursor.close()
+    return count, changes, dates
+
+def _move_in_shadows(conn, loads, strategy):
+    """
+    Replace every loaded table with its committed shadow in one transaction:
+    renamed in for swap, truncated and refilled for truncate (which keeps the
+    table itself). Only this step locks the live tables, and it runs no
+    parsing, so readers wait for a server-side copy at most.
+    """
+    cursor = conn.cursor()
+    try:
+        with telemetry.span("move_in_shadows"):
+            for table_name, _, _ in loads:
+                if strategy == "swap":
+                    _swap_in(cursor, table_name)
+                    continue
+                shadow = _shadow_name(table_name)
+                cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+                cursor.execute(f"truncate {table_name}")
+                cursor.execute(f"INSERT INTO {table_name} SELECT * FROM {shadow}")
+                cursor.execute(f"DROP TABLE {shadow}")
         conn.commit()
+    finally:
+        cursor.close()
+
+def _drop_shadows(conn, loads):
+    """Best-effort cleanup of shadows a failed parallel load left committed."""
+    cursor = conn.cursor()
+    try:
+        for table_name, _, _ in loads:
+            cursor.execute(f"DROP TABLE IF EXISTS {_shadow_name(table_name)}")
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+    finally:
+        cursor.close()
+
+def _pool_connection():
+    global _load_pool
+    if _load_pool is None:
+        # Every table holds its connection until the final commit, so the pool
+        # must cover all four even when fewer load at once.
+        _load_pool = ThreadedConnectionPool(1, max(LOAD_WORKERS, 4), **_connect_kwargs())
+    conn = _load_pool.getconn()
+    if not _is_healthy(conn):
+        _load_pool.putconn(conn, close=True)
+        conn = _load_pool.getconn()
+    return conn
+
+def _load_parallel(loads, metrics, strategy, two_phase=None):
+    """
+    Load each table on its own pooled connection at the same time. truncate
+    and swap commit their filled shadows, then move them all in with one short
+    transaction, so the live tables are locked only for that final step. The
+    in-place strategies commit nothing until every table has loaded; then all
+    transactions commit together, through two-phase commit when DB_TWO_PHASE
+    is on (needs max_prepared_transactions > 0 on the server) or one after
+    another otherwise, which can leave some tables committed if a later commit
+    fails. Always uses COPY, since the insert path commits per batch.
+    """
+    if not loads:
+        return
+    shadowed = strategy in ("swap", "truncate")
+    two_phase = (DB_TWO_PHASE if two_phase is None else two_phase) and not shadowed
+    gtrid = f"paylocity-load-{uuid.uuid4()}"
+    conns = [_pool_connection() for _ in loads]
+
+    def _run(i):
+        conn, load = conns[i], loads[i]
+        if two_phase:
+            conn.tpc_begin(conn.xid(0, gtrid, load[0]))
+        t = time.time()
+        with telemetry.span(f"load_{load[0]}") as sp:
+            count, changes, dates = _load_one_uncommitted(conn, load, strategy)
+            sp["rows"] = count
+            sp.update(changes or {})
+        _record_metric(metrics, load[0], count, t, changes, dates)
+
+    prepared = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(loads)) or 1) as pool:
+            # list() re-raises the first worker failure
+            list(pool.map(telemetry.bind(_run), range(len(loads))))
+
+        if shadowed:
+            # Shadows only: the live tables are untouched until the move.
+            for conn in conns:
+                conn.commit()
+            _move_in_shadows(conns[0], loads, strategy)
+        elif two_phase:
+            for conn in conns:
+                conn.tpc_prepare()
+                prepared.append(conn)
+            for conn in conns:
+                conn.tpc_commit()
+        else:
+            for i, conn in enumerate(conns):
+                try:
+                    conn.commit()
+                except Exception:
+                    print(json.dumps({
+                        "msg": "coordinated_commit_partial",
+                        "committed": [load[0] for load in loads[:i]],
+                        "failed": loads[i][0],
+                    }))
+                    raise
+    except Exception:
+        for conn in conns:
+            if conn.closed:
+                continue
+            try:
+                if conn in prepared:
+                    conn.tpc_rollback()
+                else:
+                    conn.rollback()
+            except psycopg2.Error:
+                pass
+        if shadowed and not conns[0].closed:
+            _drop_shadows(conns[0], loads)
+        raise
+    finally:
+        for conn in conns:
+            _load_pool.putconn(conn, close=bool(conn.closed))
+
+def refresh_aggregates(cursor, spans):
+    """
+    Refresh the labor aggregates (pay_aggregates) for {table_name: dates}
+    inside the caller's transaction; no-op when LABOR_AGGREGATES is off.
+    """
+    if not LABOR_AGGREGATES or not spans:
+        return None
+    with telemetry.span("aggregates") as sp:
+        result = refresh_labor_aggregates(cursor, spans, PAY_PERIOD_ANCHOR, PAY_PERIOD_DAYS)
+        sp.update(result)
+    return result
 
-    cursor.close()
-    conn.close()
+def _refresh_after_load(metrics):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        refresh_aggregates(cursor, {name: m["dates"] for name, m in metrics.items()})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+def upload_rows_to_postgres(ccprov_rows, ccstaff_rows, labor_rows, ccschedule_rows, strategy=None):
+    """
+    Load the four tables from row iterables. Rows are consumed lazily, so
+    generators from the cleaners flow straight into the COPY buffer.
+    Tables whose rows are None are left untouched. strategy overrides
+    LOAD_STRATEGY for this call. Once every table has loaded, the labor
+    aggregates are refreshed for the dates the load touched.
+    Returns {table_name: rows_loaded}.
+    """
+    strategy = strategy or LOAD_STRATEGY
+    table_name = 'app.clinic_ccprov'
+    lab_table_name = 'app.clinic_labor_costs'
+    staff_table_name = 'app.clinic_ccstaff'
+    schedule_table_name = 'app.clinic_ccschedule'
+
+    loads = [
+        (table_name, PROV_COLUMNS, ccprov_rows),
+        (staff_table_name, PROV_COLUMNS, ccstaff_rows),
+        (lab_table_name, LABOR_COLUMNS, labor_rows),
+        (schedule_table_name, SCHEDULE_COLUMNS, ccschedule_rows),
+    ]
+    loads = [load for load in loads if load[2] is not None]
+
+    if strategy not in ("swap", "truncate", "diff", "partition", "range"):
+        raise ValueError(f"Unknown LOAD_STRATEGY: {strategy}")
+
+    metrics = {}
+    if LOAD_CONCURRENCY == "parallel":
+        _load_parallel(loads, metrics, strategy)
+    elif LOAD_CONCURRENCY == "serial":
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            if strategy == "swap":
+                _load_swap(conn, cursor, loads, metrics)
+            elif strategy == "diff":
+                _load_diff(conn, cursor, loads, metrics)
+            elif strategy == "partition":
+                _load_each(conn, cursor, loads, metrics, _partition_rows)
+            elif strategy == "range":
+                _load_each(conn, cursor, loads, metrics, _range_rows)
+            else:
+                _load_truncate(conn, cursor, loads, metrics)
+        finally:
+            cursor.close()
+            release_db_connection(conn)
+    else:
+        raise ValueError(f"Unknown LOAD_CONCURRENCY: {LOAD_CONCURRENCY}")
+
+    print(json.dumps({"msg": "table_load_metrics", "concurrency": LOAD_CONCURRENCY, "tables": metrics}))
+    if LABOR_AGGREGATES and metrics:
+        _refresh_after_load(metrics)
+    return {name: m["rows"] for name, m in metrics.items()}
+
+def upload_to_postgres(ccprov_csv_path, ccstaff_csv_path, labor_xlsx_path, ccschedule_csv_path):
+    # A None path skips that table (used when its sources are unchanged).
+    return upload_rows_to_postgres(
+        iter_csv_rows(ccprov_csv_path) if ccprov_csv_path else None,
+        iter_csv_rows(ccstaff_csv_path) if ccstaff_csv_path else None,
+        iter_xlsx_rows(labor_xlsx_path, header_row=1) if labor_xlsx_path else None,
+        iter_csv_rows(ccschedule_csv_path) if ccschedule_csv_path else None,
+    )
@@ -1,11 +1,21 @@
+import os
 import re
+from collections import deque
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
+import telemetry
+from pay_parallel import map_ordered
+from pay_schemas import SCHEDULE_DATE_COLS
+from workbook_reader import iter_rows, read_frame
+
 # Shift dates appear in these columns in the uploaded schedules.
-DATE_COLS = [4, 6, 8, 11, 14, 15, 17]  # E, G, I, L, O, P, R
+DATE_COLS = SCHEDULE_DATE_COLS
 
 NON_SHIFT_VALUES = {
     None,
@@ -19,6 +29,25 @@ NON_SHIFT_VALUES = {
     '-',
 }
 
+# First-column labels that are never clinic names even when the rest of the row is blank.
+NON_CLINIC_LABELS = {
+    'Name', 'Employee', 'Employee ', 'Totals:', 'Manual Attendance',
+    'Report by Department', 'Detailed Schedules'
+}
+
+# "vectorized" cleans the sheet once and classifies rows with masks (parse_frame);
+# "rows" walks it row by row (iter_workbook_records); "stream" reads the sheet
+# row by row without loading it and emits bounded chunks (iter_workbook_chunks).
+SCHEDULE_PARSER = os.getenv('SCHEDULE_PARSER', 'vectorized')
+
+# Upper bound on shift records per chunk in stream mode, and an approximate
+# memory ceiling per chunk that lowers it once the real record size is known.
+SCHEDULE_CHUNK_ROWS = int(os.getenv('SCHEDULE_CHUNK_ROWS', '5000'))
+SCHEDULE_CHUNK_MAX_MB = float(os.getenv('SCHEDULE_CHUNK_MAX_MB', '32'))
+
+# Schedules repeat a few dozen shift strings, so parsed results are memoized.
+SHIFT_HOURS_CACHE_SIZE = int(os.getenv('SHIFT_HOURS_CACHE_SIZE', '4096'))
+
 TIME_RANGE_RE = re.compile(
     r'(?P<start>\d{1,2}(?::\d{2})?\s*(?:AM|PM|A|P)?)\s*[-–]\s*(?P<end>\d{1,2}(?::\d{2})?\s*(?:AM|PM|A|P)?)',
     re.IGNORECASE,
@@ -42,31 +71,13 @@ def is_clinic_row(values):
     first = values[0] if values else None
     if not first:
         return False
-    blocked = {
-        'Name', 'Employee', 'Employee ', 'Totals:', 'Manual Attendance',
-        'Report by Department', 'Detailed Schedules'
-    }
-    if first in blocked:
+    if first in NON_CLINIC_LABELS:
         return False
     return all(v is None for v in values[1:])
 
 
 def _read_schedule_workbook(path):
-    suffix = Path(path).suffix.lower()
-    engine = None
-    if suffix == '.xlsx':
-        engine = 'openpyxl'
-    elif suffix == '.xls':
-        engine = 'xlrd'
-
-    try:
-        return pd.read_excel(path, sheet_name=0, header=None, engine=engine)
-    except ImportError as exc:
-        if suffix == '.xls':
-            raise ImportError(
-                "Reading .xls files requires the 'xlrd' package in your Lambda deployment package or layer."
-            ) from exc
-        raise
+    return read_frame(path)
 
 
 def _normalize_ampm(value):
@@ -88,13 +99,24 @@ def _parse_time(value):
     return None
 
 
-def calculate_shift_hours(shift):
-    if shift is None:
+@lru_cache(maxsize=SHIFT_HOURS_CACHE_SIZE)
+def _parse_time_minutes(value):
+    parsed = _parse_time(value)
+    if parsed is None:
         return None
+    return parsed.hour * 60 + parsed.minute
 
-    text = clean_cell(shift)
-    if text is None:
-        return None
+
+def _hours_between(start_minutes, end_minutes):
+    if end_minutes <= start_minutes:
+        end_minutes += 24 * 60
+    # Same float as timedelta.total_seconds() / 3600: both are one correctly rounded division.
+    return round((end_minutes - start_minutes) / 60, 2)
+
+
+@lru_cache(maxsize=SHIFT_HOURS_CACHE_SIZE)
+def _shift_hours_for_text(text):
+    """Hours for an already clean_cell-normalized shift string."""
     if text.lower() in NON_SHIFT_VALUES:
         return None
 
@@ -102,29 +124,103 @@ def calculate_shift_hours(shift):
     if not match:
         return None
 
-    start = _parse_time(match.group('start'))
-    end = _parse_time(match.group('end'))
+    start = _parse_time_minutes(match.group('start'))
+    end = _parse_time_minutes(match.group('end'))
     if start is None or end is None:
         return None
 
-    if end <= start:
-        end += timedelta(days=1)
+    return _hours_between(start, end)
 
-    hours = round((end - start).total_seconds() / 3600, 2)
-    return hours
 
+def calculate_shift_hours(shift):
+    if shift is None:
+        return None
 
-def parse_workbook(path):
-    df = _read_schedule_workbook(path)
-    results = []
+    text = clean_cell(shift)
+    if text is None:
+        return None
+    return _shift_hours_for_text(text)
+
+
+def calculate_shift_hours_series(shifts):
+    """
+    Batch form of calculate_shift_hours for a pandas Series.
+
+    Only the distinct values are cleaned and matched (one str.extract over the
+    uniques), endpoints go through the time cache, and the results are mapped
+    back. Returns an object Series holding floats or None, like the scalar
+    function.
+    """
+    shifts = pd.Series(shifts, dtype=object)
+    # Missing values get code -1 rather than a unique: every NaN is its own
+    # object, so they would not even match themselves in a lookup.
+    codes, uniques = pd.factorize(shifts)
+    uniques = pd.Series(uniques, dtype=object)
+    texts = uniques.map(clean_cell)
+
+    candidates = texts.where(texts.notna() & ~texts.str.lower().isin(NON_SHIFT_VALUES))
+    parts = candidates.str.extract(TIME_RANGE_RE)
+    start = parts['start'].map(_parse_time_minutes, na_action='ignore')
+    end = parts['end'].map(_parse_time_minutes, na_action='ignore')
+
+    hours = [
+        _hours_between(int(s), int(e)) if pd.notna(s) and pd.notna(e) else None
+        for s, e in zip(start, end)
+    ]
+    # The trailing None is what code -1 (a missing shift) picks up.
+    lookup = np.array(hours + [None], dtype=object)
+    return pd.Series(lookup[codes], index=shifts.index, dtype=object)
+
+
+def shift_hours_cache_info():
+    """Hit rates of the shift-string and time-endpoint caches, for logging."""
+    info = {}
+    for name, fn in (('shift', _shift_hours_for_text), ('time', _parse_time_minutes)):
+        stats = fn.cache_info()
+        lookups = stats.hits + stats.misses
+        info[name] = {
+            'hits': stats.hits,
+            'misses': stats.misses,
+            'size': stats.currsize,
+            'hit_rate': round(stats.hits / lookups, 4) if lookups else None,
+        }
+    return info
+
+
+OUTPUT_COLUMNS = [
+    'cc1',
+    'employee_name',
+    'employee_number',
+    'shift_date',
+    'shift_day',
+    'shift',
+    'shift_hours',
+    'manual_attendance',
+    'manual_attendance_points',
+]
+
+
+def iter_workbook_records(df):
+    """Yield one dict per employee/day shift cell of a raw schedule sheet."""
+    return iter_row_records(row_values(df, r) for r in range(len(df)))
+
+
+def iter_row_records(rows):
+    """
+    iter_workbook_records over an iterator of clean_cell-ed row lists. Only the
+    previous row, the current row and the two after it (the Manual Attendance
+    points and shift) are held at any time.
+    """
+    rows = iter(rows)
+    window = deque(islice(rows, 3))
+    prev_values = []
     current_clinic = None
     current_days = {}
     current_dates = {}
-    r = 0
 
-    while r < len(df):
-        values = row_values(df, r)
-        col_a = values[0]
+    while window:
+        values = window[0]
+        col_a = values[0] if values else None
 
         if is_clinic_row(values):
             clinic_name = clean_cell(col_a)
@@ -133,12 +229,11 @@ def parse_workbook(path):
             if clinic_name and clinic_name.lower() != 'wendy':
                 current_clinic = clinic_name.title()  # initcap equivalent
 
-            r += 1
+            prev_values = _advance(window, rows)
             continue
 
         # Header block: previous row has day names, current row starts with Name.
         if col_a == 'Name':
-            prev_values = row_values(df, r - 1) if r > 0 else []
             current_days = {
                 c: clean_cell(prev_values[c]) if c < len(prev_values) else None
                 for c in DATE_COLS
@@ -147,21 +242,21 @@ def parse_workbook(path):
                 c: clean_cell(values[c]) if c < len(values) else None
                 for c in DATE_COLS
             }
-            r += 1
+            prev_values = _advance(window, rows)
             continue
 
         if col_a is None or col_a == 'Totals:':
-            r += 1
+            prev_values = _advance(window, rows)
             continue
 
         employee_name = col_a
-        employee_number = values[1]
+        employee_number = values[1] if len(values) > 1 else None
         if employee_number is None or not current_dates:
-            r += 1
+            prev_values = _advance(window, rows)
             continue
 
-        row_plus_1 = row_values(df, r + 1) if r + 1 < len(df) else []
-        row_plus_2 = row_values(df, r + 2) if r + 2 < len(df) else []
+        row_plus_1 = window[1] if len(window) > 1 else []
+        row_plus_2 = window[2] if len(window) > 2 else []
 
         for c in DATE_COLS:
             raw_shift = values[c] if c < len(values) else None
@@ -177,7 +272,7 @@ def parse_workbook(path):
                 manual_points = None
 
             shift = clean_cell(shift)
-            results.append({
+            yield {
                 'cc1': current_clinic,
                 'employee_name': employee_name,
                 'employee_number': employee_number,
@@ -187,50 +282,214 @@ def parse_workbook(path):
                 'shift_hours': calculate_shift_hours(shift),
                 'manual_attendance': manual_attendance,
                 'manual_attendance_points': clean_cell(manual_points),
-            })
+            }
+
+        prev_values = _advance(window, rows)
+
+
+def _advance(window, rows):
+    """Slide the lookahead window one row; returns the row that left it."""
+    left = window.popleft()
+    for row in islice(rows, 1):
+        window.append(row)
+    return left
 
-        r += 1
 
-    final_df = pd.DataFrame(results)
+def _finalize_frame(final_df):
     if final_df.empty:
         return final_df
 
-    parsed_dates = pd.to_datetime(final_df['shift_date'], errors='coerce')
-    final_df['shift_date'] = parsed_dates.dt.strftime('%Y-%m-%d').where(
-        parsed_dates.notna(),
-        final_df['shift_date'],
+    with telemetry.span('coerce_dates') as sp:
+        # format='mixed' parses each value on its own; otherwise pandas infers
+        # one format from the first date and leaves the other style unparsed,
+        # which would make the result depend on where a chunk starts.
+        parsed_dates = pd.to_datetime(final_df['shift_date'], errors='coerce', format='mixed')
+        final_df['shift_date'] = parsed_dates.dt.strftime('%Y-%m-%d').where(
+            parsed_dates.notna(),
+            final_df['shift_date'],
+        )
+        sp['rows'] = len(final_df)
+    return final_df[OUTPUT_COLUMNS]
+
+
+def _clean_frame(df):
+    # DataFrame.map replaced applymap in pandas 2.1
+    cleaned = df.map(clean_cell) if hasattr(df, 'map') else df.applymap(clean_cell)
+    cleaned = cleaned.reindex(columns=range(max(df.shape[1], max(DATE_COLS) + 1)))
+    return cleaned.astype(object).where(cleaned.notna(), None)
+
+
+def _none_where_na(values):
+    values = np.asarray(values, dtype=object)
+    return np.where(pd.isna(values), None, values)
+
+
+def parse_frame(df):
+    """
+    Vectorized equivalent of building a frame from iter_workbook_records(df).
+
+    Every cell is cleaned once; clinic, header and employee rows are found with
+    boolean masks, clinic and header context is forward-filled, and the
+    DATE_COLS of each employee row are unpivoted into one record per day.
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    clean = _clean_frame(df)
+    n = len(clean)
+    col_a = clean[0]
+    present = clean.notna()
+
+    is_clinic = present[0] & ~col_a.isin(NON_CLINIC_LABELS) & ~present.iloc[:, 1:].any(axis=1)
+    is_header = ~is_clinic & (col_a == 'Name')
+
+    clinic_title = col_a.where(is_clinic).map(
+        lambda v: v.title() if isinstance(v, str) and v.lower() != 'wendy' else None
     )
+    current_clinic = clinic_title.where(clinic_title.notna()).ffill()
+
+    # Row index of the most recent header row; dates come from it, day names from the row above.
+    header_pos = pd.Series(np.where(is_header, np.arange(n), np.nan)).ffill()
+
+    is_employee = (
+        ~is_clinic
+        & ~is_header
+        & present[0]
+        & (col_a != 'Totals:')
+        & present[1]
+        & header_pos.notna()
+    )
+    emp = np.flatnonzero(is_employee.to_numpy())
+    if len(emp) == 0:
+        return pd.DataFrame()
+
+    date_block = clean[DATE_COLS]
+    hdr = header_pos.to_numpy()[emp].astype(int)
+    dates = date_block.to_numpy()[hdr]
+    prev = hdr - 1
+    days = date_block.to_numpy()[np.clip(prev, 0, None)]
+    days[prev < 0] = None
+
+    raw = date_block.to_numpy()[emp]
+    plus_1 = _none_where_na(date_block.shift(-1).to_numpy()[emp])
+    plus_2 = _none_where_na(date_block.shift(-2).to_numpy()[emp])
+    manual = raw == 'Manual Attendance'
+    shifts = np.where(manual, plus_2, raw)
+    points = np.where(manual, plus_1, None)
+
+    width = len(DATE_COLS)
+    shift_list = shifts.ravel().tolist()
+
+    final_df = pd.DataFrame({
+        'cc1': np.repeat(_none_where_na(current_clinic.to_numpy()[emp]), width).tolist(),
+        'employee_name': np.repeat(col_a.to_numpy()[emp], width).tolist(),
+        'employee_number': np.repeat(clean[1].to_numpy()[emp], width).tolist(),
+        'shift_date': dates.ravel().tolist(),
+        'shift_day': days.ravel().tolist(),
+        'shift': shift_list,
+        'shift_hours': calculate_shift_hours_series(shift_list).tolist(),
+        'manual_attendance': manual.ravel().tolist(),
+        'manual_attendance_points': points.ravel().tolist(),
+    })
+    return final_df
+
+
+def iter_workbook_chunks(path, chunk_rows=None, max_chunk_mb=None):
+    """
+    Parse a schedule workbook without loading the sheet: rows come straight
+    from the reader (openpyxl read-only, xlrd on demand, or calamine) and
+    finalized DataFrames of at most chunk_rows records are yielded as they
+    fill. After the first chunk the cap is lowered, if needed, so a chunk's
+    records plus its frame stay under roughly max_chunk_mb.
+    """
+    chunk_rows = chunk_rows or SCHEDULE_CHUNK_ROWS
+    max_bytes = (max_chunk_mb or SCHEDULE_CHUNK_MAX_MB) * 1024 * 1024
+    cap = chunk_rows
+    rows = ([clean_cell(v) for v in row] for row in iter_rows(path))
+
+    records = []
+    for record in iter_row_records(rows):
+        records.append(record)
+        if len(records) >= cap:
+            chunk = _finalize_frame(pd.DataFrame(records))
+            records = []
+            # The record dicts cost at least as much as the frame built from them.
+            per_row = 2 * chunk.memory_usage(deep=True).sum() / len(chunk)
+            cap = max(1, min(chunk_rows, int(max_bytes / per_row)))
+            telemetry.count('schedule_chunks')
+            yield chunk
+    if records:
+        telemetry.count('schedule_chunks')
+        yield _finalize_frame(pd.DataFrame(records))
+
+
+def parse_workbook(path, parser=None):
+    parser = parser or SCHEDULE_PARSER
+    with telemetry.span('schedule_workbook') as sp:
+        if parser == 'stream':
+            with telemetry.span('parse_stream'):
+                chunks = list(iter_workbook_chunks(path))
+            final_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        else:
+            with telemetry.span('read') as read_sp:
+                df = _read_schedule_workbook(path)
+                read_sp['sheet_rows'] = len(df)
+            with telemetry.span(f'parse_{parser}'):
+                if parser == 'rows':
+                    final_df = pd.DataFrame(list(iter_workbook_records(df)))
+                else:
+                    final_df = parse_frame(df)
+            final_df = _finalize_frame(final_df)
+        sp['rows'] = len(final_df)
+    telemetry.count('rows_processed', len(final_df))
+    return final_df
+
+
+def iter_schedule_rows(ccschedule_paths, chunk_rows=None):
+    """
+    Streaming counterpart of clean_ccschedule_files: yields rows in
+    OUTPUT_COLUMNS order, holding one chunk of shift records at a time and
+    never the whole sheet (see iter_workbook_chunks).
+    """
+    for path in ccschedule_paths:
+        for chunk in iter_workbook_chunks(path, chunk_rows=chunk_rows):
+            telemetry.count('rows_processed', len(chunk))
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            yield from chunk.itertuples(index=False, name=None)
+
+
+def write_ccschedule_csv(ccschedule_paths, out_dir='/tmp', output_filename='ccschedule_merged_clean.csv'):
+    """
+    clean_ccschedule_files for SCHEDULE_PARSER=stream: appends each chunk to
+    the CSV as it is parsed, so memory stays bounded by one chunk rather than
+    all files. Returns (csv_path, row_count).
+    """
+    out_path = Path(out_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+    csv_path = out_path / output_filename
 
-    ordered_cols = [
-        'cc1',
-        'employee_name',
-        'employee_number',
-        'shift_date',
-        'shift_day',
-        'shift',
-        'shift_hours',
-        'manual_attendance',
-        'manual_attendance_points',
-    ]
-    return final_df[ordered_cols]
+    count = 0
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(f, index=False)
+        for path in ccschedule_paths:
+            with telemetry.span('schedule_workbook') as sp:
+                rows = 0
+                with telemetry.span('parse_stream'):
+                    for chunk in iter_workbook_chunks(path):
+                        chunk.to_csv(f, index=False, header=False)
+                        rows += len(chunk)
+                sp['rows'] = rows
+            count += rows
+    telemetry.count('rows_processed', count)
+    return str(csv_path), count
 
 
 def clean_ccschedule_files(ccschedule_paths, out_dir='/tmp', output_filename='ccschedule_merged_clean.csv'):
     out_path = Path(out_dir)
     out_path.mkdir(parents=True, exist_ok=True)
 
-    frames = [parse_workbook(path) for path in ccschedule_paths]
-    final_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[
-        'cc1',
-        'employee_name',
-        'employee_number',
-        'shift_date',
-        'shift_day',
-        'shift',
-        'shift_hours',
-        'manual_attendance',
-        'manual_attendance_points',
-    ])
+    frames = map_ordered(parse_workbook, ccschedule_paths)
+    final_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=OUTPUT_COLUMNS)
 
     csv_path = out_path / output_filename
     final_df.to_csv(csv_path, index=False)
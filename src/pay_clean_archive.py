@@ -0,0 +1,183 @@
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+from botocore.exceptions import ClientError
+
+import telemetry
+from pay_parsed_cache import PARSED_CACHE_VERSION, cached_parse, file_sha256
+
+# Parsed frames are also written to S3 as zstd Parquet, keyed by the SHA-256
+# of the source workbook, so reprocessing a file that was seen before reads
+# the clean frame instead of downloading and parsing the Excel again. A small
+# pointer object per source ETag lets a run find the archive before
+# downloading anything. Needs the optional 'pyarrow' package.
+CLEAN_ARCHIVE = os.getenv("CLEAN_ARCHIVE", "false").lower() in ("1", "true", "yes")
+CLEAN_ARCHIVE_BUCKET = os.getenv("CLEAN_ARCHIVE_BUCKET") or os.getenv("S3_BUCKET")
+CLEAN_ARCHIVE_PREFIX = os.getenv("CLEAN_ARCHIVE_PREFIX", "clean-archive/")
+
+_s3 = None
+
+
+def _s3_client():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client("s3")
+    return _s3
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("CLEAN_ARCHIVE=true requires the 'pyarrow' package.") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def archive_key(sha, kind):
+    return f"{CLEAN_ARCHIVE_PREFIX}{kind}/v{PARSED_CACHE_VERSION}/{sha}.parquet"
+
+
+def _etag_key(etag, kind):
+    etag = etag.strip('"')
+    return f"{CLEAN_ARCHIVE_PREFIX}etag/{kind}/v{PARSED_CACHE_VERSION}/{etag}"
+
+
+def _get(key):
+    try:
+        return _s3_client().get_object(Bucket=CLEAN_ARCHIVE_BUCKET, Key=key)["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+def _column_type(values):
+    """Arrow type for an object column's non-null values, and whether ints were widened to float."""
+    import numpy as np
+    import pyarrow as pa
+
+    kinds = set()
+    for v in values:
+        if isinstance(v, (bool, np.bool_)):
+            kinds.add("bool")
+        elif isinstance(v, (int, np.integer)):
+            kinds.add("int")
+        elif isinstance(v, (float, np.floating)):
+            kinds.add("float")
+        elif isinstance(v, datetime):
+            kinds.add("datetime")
+        else:
+            kinds.add("str")
+    if kinds == {"bool"}:
+        return pa.bool_(), False
+    if kinds == {"int"}:
+        return pa.int64(), False
+    if kinds and kinds <= {"int", "float"}:
+        return pa.float64(), "int" in kinds
+    if kinds == {"datetime"}:
+        return pa.timestamp("us"), False
+    return pa.string(), False
+
+
+def frame_to_parquet(df):
+    """
+    Parquet bytes (zstd) for a parsed frame. Object columns get one Arrow type
+    each; mixed columns are stored as text, which COPY renders the same way.
+    Column labels, frame.attrs and the int-widened columns go in the metadata.
+    """
+    pa, pq = _require_pyarrow()
+
+    arrays, widened = [], []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype == object:
+            mask = col.isna().to_numpy()
+            values = [v for v, missing in zip(col.tolist(), mask) if not missing]
+            arrow_type, ints_widened = _column_type(values)
+            if arrow_type == pa.string():
+                data = [None if missing else str(v) for v, missing in zip(col.tolist(), mask)]
+            elif arrow_type == pa.float64():
+                data = [None if missing else float(v) for v, missing in zip(col.tolist(), mask)]
+            else:
+                data = [None if missing else v for v, missing in zip(col.tolist(), mask)]
+            arrays.append(pa.array(data, type=arrow_type))
+            if ints_widened:
+                widened.append(i)
+        else:
+            arrays.append(pa.Array.from_pandas(col))
+
+    meta = {"columns": list(df.columns), "attrs": df.attrs, "int_widened": widened}
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+    table = table.replace_schema_metadata({b"paylocity": json.dumps(meta, default=str).encode()})
+    buf = io.BytesIO()
+    pq.write_table(table, buf, compression="zstd")
+    return buf.getvalue()
+
+
+def parquet_to_frame(data):
+    """Inverse of frame_to_parquet: object columns with None for missing values."""
+    import pandas as pd
+
+    _, pq = _require_pyarrow()
+    table = pq.read_table(io.BytesIO(data))
+    meta = json.loads(table.schema.metadata[b"paylocity"])
+    df = table.to_pandas(types_mapper=pd.ArrowDtype).astype(object)
+    df = df.where(df.notna(), None)
+    for i in meta["int_widened"]:
+        # These held workbook ints next to floats; readers never yield integral floats.
+        df.iloc[:, i] = [int(v) if isinstance(v, float) and v.is_integer() else v for v in df.iloc[:, i]]
+    df.columns = meta["columns"]
+    df.attrs.update(meta["attrs"])
+    return df
+
+
+def find_archived(objects, kinds):
+    """
+    {name: frame} for the source objects ({name: s3 object}) already archived
+    under their ETag; these need neither download nor parsing.
+    """
+    def _one(name):
+        obj = objects[name]
+        if not obj.get("ETag"):
+            return None
+        pointer = _get(_etag_key(obj["ETag"], kinds[name]))
+        if pointer is None:
+            return None
+        data = _get(archive_key(pointer.decode(), kinds[name]))
+        return parquet_to_frame(data) if data is not None else None
+
+    with ThreadPoolExecutor(max_workers=max(1, len(objects))) as pool:
+        found = dict(zip(objects, pool.map(telemetry.bind(_one), objects)))
+    hits = {name: df for name, df in found.items() if df is not None}
+    print(json.dumps({"msg": "clean_archive_lookup", "hits": sorted(hits), "misses": sorted(set(objects) - set(hits))}))
+    return hits
+
+
+def archived_parse(path, kind, parse_fn, source=None):
+    """
+    cached_parse backed by the S3 archive: a file whose content was archived
+    before (under any key) is read back from Parquet; otherwise it is parsed
+    and archived. source is the S3 object it came from, for the ETag pointer.
+    """
+    sha = file_sha256(path)
+    data = _get(archive_key(sha, kind))
+    if data is not None:
+        print(json.dumps({"msg": "clean_archive_hit", "kind": kind, "path": path, "sha256": sha}))
+        df = parquet_to_frame(data)
+    else:
+        df = cached_parse(path, kind, parse_fn, sha=sha)
+        _s3_client().put_object(
+            Bucket=CLEAN_ARCHIVE_BUCKET,
+            Key=archive_key(sha, kind),
+            Body=frame_to_parquet(df),
+            Metadata={"source-key": (source or {}).get("Key", ""), "source-etag": (source or {}).get("ETag", "").strip('"')},
+        )
+        print(json.dumps({"msg": "clean_archive_store", "kind": kind, "path": path, "sha256": sha}))
+    if source and source.get("ETag"):
+        _s3_client().put_object(Bucket=CLEAN_ARCHIVE_BUCKET, Key=_etag_key(source["ETag"], kind), Body=sha.encode())
+    return df
@@ -0,0 +1,108 @@
+import csv
+import json
+from datetime import date
+
+import telemetry
+
+# Text forms accepted for boolean columns (after strip/lower); workbook
+# booleans and 0/1 numbers are accepted as well.
+_BOOLEAN_TEXT = {
+    "true": True, "t": True, "yes": True, "y": True, "1": True, "1.0": True,
+    "false": False, "f": False, "no": False, "n": False, "0": False, "0.0": False,
+}
+
+
+def _numeric(col):
+    import pandas as pd
+
+    # Only decides which cells are numbers; coerce_frame writes the values
+    # themselves, so they are never rounded through float64.
+    return pd.to_numeric(col, errors="coerce").astype("float64")
+
+
+def _dates(col):
+    import pandas as pd
+
+    # Only text and datetimes are dates; a bare number would become an epoch offset.
+    dated = col.map(lambda v: isinstance(v, (str, date)))
+    return pd.to_datetime(col.where(dated), errors="coerce", format="mixed").dt.normalize()
+
+
+def _booleans(col):
+    text = col.astype("string").str.strip().str.lower()
+    return text.map(_BOOLEAN_TEXT).astype("boolean")
+
+
+_CONVERTERS = {"numeric": _numeric, "date": _dates, "boolean": _booleans}
+
+
+def coerce_frame(rows, columns, types, label=None):
+    """
+    DataFrame of rows typed column by column from the declared types: date
+    to datetime64 and boolean to a nullable boolean; numeric cells keep their
+    value as read (ints stay ints, decimals stay exact), with padded or
+    comma-grouped text cleaned up; text is left as it is. Cells that do not
+    convert become missing and are counted as rejected_cells instead of
+    failing the load.
+    """
+    import pandas as pd
+
+    # object first, so text columns keep their values as written (no 1000 -> 1000.0).
+    df = pd.DataFrame(list(rows), columns=columns, dtype=object)
+    for column in columns:
+        pg_type = types.get(column, "text")
+        if pg_type == "text":
+            continue
+        if pg_type not in _CONVERTERS:
+            raise ValueError(f"Unknown column type {pg_type!r} for {column}")
+        col = df[column]
+        typed = _CONVERTERS[pg_type](col)
+
+        failed = typed.isna() & col.notna()
+        cleaned = None
+        if failed.any():
+            # Only the cells that missed the fast path are looked at as text:
+            # blanks are NULL, not rejections, and padded or comma-grouped
+            # text ("1,234.50 ") gets a second try.
+            text = col[failed].astype(str).str.strip()
+            text = text[text != ""]
+            if pg_type == "numeric":
+                text = text.str.replace(",", "", regex=False)
+            typed[text.index] = _CONVERTERS[pg_type](text.astype(object))
+            cleaned = text[typed[text.index].notna()]
+            rejected = text.index[typed[text.index].isna()]
+            if len(rejected):
+                telemetry.count("rejected_cells", len(rejected))
+                print(json.dumps({
+                    "msg": "rejected_cells",
+                    "table": label,
+                    "column": column,
+                    "type": pg_type,
+                    "count": len(rejected),
+                    "examples": [str(v) for v in col[rejected[:3]]],
+                }))
+        if pg_type == "numeric":
+            values = col.where(typed.notna(), None)
+            if cleaned is not None:
+                values[cleaned.index] = cleaned
+            typed = values
+        df[column] = typed
+    return df
+
+
+def frame_csv(df, buf):
+    """
+    Write a coerce_frame result as COPY csv: missing values as empty fields
+    (NULL), dates as YYYY-MM-DD. Columns are turned into lists and written by
+    csv.writer, which formats floats faster than DataFrame.to_csv.
+    """
+    columns = []
+    for name in df.columns:
+        col = df[name]
+        if col.dtype.kind == "M":
+            values = col.to_numpy().astype("datetime64[D]").astype(str).astype(object)
+        else:
+            values = col.to_numpy(dtype=object, copy=True)
+        values[col.isna().to_numpy()] = None
+        columns.append(values.tolist())
+    csv.writer(buf).writerows(zip(*columns))
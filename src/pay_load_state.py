@@ -0,0 +1,99 @@
+STATE_TABLE = "app.paylocity_load_state"
+
+# Which source families feed each target table.
+TABLE_SOURCES = {
+    "app.clinic_ccprov": ["ccprov1", "ccprov2"],
+    "app.clinic_ccstaff": ["ccstaff"],
+    "app.clinic_labor_costs": ["labor"],
+    "app.clinic_ccschedule": ["ccschedule1", "ccschedule2", "ccschedule3"],
+}
+
+def ensure_state_table(cursor):
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        table_name text NOT NULL,
+        source text NOT NULL,
+        s3_key text NOT NULL,
+        etag text,
+        last_modified timestamptz,
+        loaded_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (table_name, source)
+    )""")
+
+def get_loaded_sources(cursor):
+    """Returns {table_name: {source: (s3_key, etag)}} for the last successful load."""
+    ensure_state_table(cursor)
+    cursor.execute(f"SELECT table_name, source, s3_key, etag FROM {STATE_TABLE}")
+    state = {}
+    for table_name, source, key, etag in cursor.fetchall():
+        state.setdefault(table_name, {})[source] = (key, etag)
+    return state
+
+def stale_tables(newest, loaded, force=False):
+    """
+    newest: {source: s3 object dict from list_objects_v2}
+    loaded: output of get_loaded_sources
+    returns the target tables whose sources changed since they were last loaded.
+    """
+    stale = []
+    for table_name, sources in TABLE_SOURCES.items():
+        if force:
+            stale.append(table_name)
+            continue
+        seen = loaded.get(table_name, {})
+        for source in sources:
+            obj = newest[source]
+            if seen.get(source) != (obj["Key"], obj.get("ETag")):
+                stale.append(table_name)
+                break
+    return stale
+
+def record_loaded_sources(cursor, newest, tables):
+    """Upsert the manifest rows for tables that were just loaded; the caller commits."""
+    ensure_state_table(cursor)
+    for table_name in tables:
+        for source in TABLE_SOURCES[table_name]:
+            obj = newest[source]
+            cursor.execute(
+                f"""INSERT INTO {STATE_TABLE} (table_name, source, s3_key, etag, last_modified, loaded_at)
+                    VALUES (%s, %s, %s, %s, %s, now())
+                    ON CONFLICT (table_name, source) DO UPDATE SET
+                        s3_key = EXCLUDED.s3_key,
+                        etag = EXCLUDED.etag,
+                        last_modified = EXCLUDED.last_modified,
+                        loaded_at = EXCLUDED.loaded_at""",
+                (table_name, source, obj["Key"], obj.get("ETag"), obj.get("LastModified")),
+            )
+
+# Backfill checkpoints: one row per file set loaded by a backfill run, so an
+# interrupted backfill started again with the same backfill_id skips the sets
+# it already finished.
+BACKFILL_TABLE = "app.paylocity_backfill_state"
+
+def ensure_backfill_table(cursor):
+    cursor.execute(f"""CREATE TABLE IF NOT EXISTS {BACKFILL_TABLE} (
+        backfill_id text NOT NULL,
+        file_set text NOT NULL,
+        tables text[] NOT NULL,
+        row_count bigint NOT NULL,
+        loaded_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (backfill_id, file_set)
+    )""")
+
+def get_completed_sets(cursor, backfill_id):
+    """The file sets backfill_id has already loaded."""
+    ensure_backfill_table(cursor)
+    cursor.execute(f"SELECT file_set FROM {BACKFILL_TABLE} WHERE backfill_id = %s", (backfill_id,))
+    return {row[0] for row in cursor.fetchall()}
+
+def record_set_done(cursor, backfill_id, file_set, tables, row_count):
+    """Checkpoint one loaded file set; the caller commits."""
+    ensure_backfill_table(cursor)
+    cursor.execute(
+        f"""INSERT INTO {BACKFILL_TABLE} (backfill_id, file_set, tables, row_count, loaded_at)
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT (backfill_id, file_set) DO UPDATE SET
+                tables = EXCLUDED.tables,
+                row_count = EXCLUDED.row_count,
+                loaded_at = EXCLUDED.loaded_at""",
+        (backfill_id, file_set, list(tables), row_count),
+    )
@@ -0,0 +1,73 @@
+import json
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from concurrent.futures.process import BrokenProcessPool
+
+import telemetry
+
+# Lambda allocates vCPUs in proportion to memory: one full vCPU per 1,769 MB, up to 6.
+LAMBDA_MB_PER_VCPU = 1769
+LAMBDA_MAX_VCPUS = 6
+
+# "auto" sizes the pool from the Lambda memory setting (or cpu_count locally);
+# an integer pins it, and 1 forces serial parsing.
+CLEAN_WORKERS = os.getenv("CLEAN_WORKERS", "auto")
+
+def available_vcpus():
+    memory_mb = os.getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+    if memory_mb:
+        return max(1, min(LAMBDA_MAX_VCPUS, math.ceil(int(memory_mb) / LAMBDA_MB_PER_VCPU)))
+    return os.cpu_count() or 1
+
+def clean_worker_count(tasks):
+    if CLEAN_WORKERS == "auto":
+        workers = available_vcpus()
+    else:
+        workers = int(CLEAN_WORKERS)
+    return max(1, min(workers, tasks))
+
+def map_ordered(fn, items):
+    """
+    [fn(item) for item in items], run in a process pool when more than one
+    worker is available. Results keep the input order.
+
+    Falls back to running serially when a pool cannot be started or breaks
+    (Lambda has no /dev/shm, so multiprocessing semaphores fail there on
+    smaller memory sizes). fn and items must be picklable.
+    """
+    items = list(items)
+    workers = clean_worker_count(len(items))
+    if workers <= 1:
+        return [fn(item) for item in items]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, items))
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        print(json.dumps({"msg": "process_pool_unavailable", "fallback": "serial", "error": str(e)}))
+        return [fn(item) for item in items]
+
+def imap_bounded(fn, items, workers):
+    """
+    fn(item) for each item on a thread pool, yielding results in input order.
+    At most `workers` items run ahead of the consumer, so a slow consumer
+    holds back new work instead of letting finished results pile up. Items
+    not yet started when the consumer stops are cancelled.
+    """
+    items = iter(items)
+    # Bound on the first next(), so fn's spans nest under the consumer's.
+    fn = telemetry.bind(fn)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque(pool.submit(fn, item) for item in islice(items, max(1, workers)))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(pool.submit(fn, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
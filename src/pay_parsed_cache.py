@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Parsed frames are kept in /tmp, which survives between warm invocations of
+# the same Lambda container. Bump PARSED_CACHE_VERSION whenever a parser's
+# output changes so stale entries are ignored.
+PARSED_CACHE_DIR = os.getenv("PARSED_CACHE_DIR", "/tmp/parsed_cache")
+PARSED_CACHE_MAX_MB = int(os.getenv("PARSED_CACHE_MAX_MB", "256"))
+PARSED_CACHE_VERSION = "2"
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_path(sha, kind):
+    return os.path.join(PARSED_CACHE_DIR, f"{kind}-v{PARSED_CACHE_VERSION}-{sha}.pkl")
+
+def _prune(keep):
+    entries = []
+    for name in os.listdir(PARSED_CACHE_DIR):
+        if name.endswith(".tmp"):
+            # Still being written by another parse.
+            continue
+        p = os.path.join(PARSED_CACHE_DIR, name)
+        try:
+            entries.append((os.path.getmtime(p), os.path.getsize(p), p))
+        except FileNotFoundError:
+            # Pruned or renamed by a parse running on another thread.
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= PARSED_CACHE_MAX_MB * 1024 * 1024:
+            break
+        if p != keep:
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def _store(df, cache_file):
+    """
+    Pickle df to cache_file through a temp file of its own, so parses of the
+    same content on other threads or processes never write the same file.
+    The cache is an optimisation: a failed write is logged and ignored.
+    Returns whether the frame was stored.
+    """
+    tmp_file = None
+    try:
+        os.makedirs(PARSED_CACHE_DIR, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=PARSED_CACHE_DIR, prefix=os.path.basename(cache_file) + ".", suffix=".tmp")
+        os.close(fd)
+        df.to_pickle(tmp_file)
+        os.replace(tmp_file, cache_file)
+        tmp_file = None
+        _prune(keep=cache_file)
+        return True
+    except Exception as e:
+        print(json.dumps({"msg": "parsed_cache_write_failed", "path": cache_file, "error": str(e)}))
+        return False
+    finally:
+        if tmp_file is not None:
+            try:
+                os.remove(tmp_file)
+            except FileNotFoundError:
+                pass
+
+def cached_parse(path, kind, parse_fn, sha=None):
+    """
+    Returns parse_fn(path) as a DataFrame, reusing an earlier result for a
+    file with the same content. Frames are pickled, so column dtypes, Python
+    values and frame.attrs come back exactly as the parser produced them.
+    Pass sha if the file's SHA-256 is already known.
+    """
+    import pandas as pd
+
+    sha = sha or file_sha256(path)
+    cache_file = _cache_path(sha, kind)
+    try:
+        df = pd.read_pickle(cache_file)
+        print(json.dumps({"msg": "parsed_cache_hit", "kind": kind, "path": path, "sha256": sha}))
+        return df
+    except FileNotFoundError:
+        # Not cached yet, or pruned by another parse since.
+        pass
+
+    df = parse_fn(path)
+    if _store(df, cache_file):
+        print(json.dumps({"msg": "parsed_cache_store", "kind": kind, "path": path, "sha256": sha}))
+    return df
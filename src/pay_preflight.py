@@ -0,0 +1,253 @@
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+from pay_load_state import TABLE_SOURCES
+from pay_schemas import HEADER_LAYOUTS, SCHEDULE_DATE_COLS, header_problems, source_header
+
+# Check every source's header against the declared schemas (pay_schemas)
+# before anything is downloaded, parsed or truncated. Only the start of each
+# workbook is read, through ranged GETs of PREFLIGHT_BLOCK_KB blocks: the zip
+# directory, the workbook/style/shared-string parts and the first sheet rows.
+# SCHEMA_HEADER_CHECK is "width" (one non-blank label per column), "names"
+# (also the declared labels, in order) or "off". Off by default until the
+# declared labels have been checked against real exports (see pay_schemas).
+PREFLIGHT = os.getenv("PREFLIGHT", "false").lower() in ("1", "true", "yes")
+SCHEMA_HEADER_CHECK = os.getenv("SCHEMA_HEADER_CHECK", "width")
+PREFLIGHT_BLOCK_KB = int(os.getenv("PREFLIGHT_BLOCK_KB", "256"))
+# Schedules have no single header row; one of the first rows must be a week
+# header ("Name" in column A and dates in the shift date columns).
+PREFLIGHT_SCAN_ROWS = int(os.getenv("PREFLIGHT_SCAN_ROWS", "100"))
+
+_FAMILY_TABLES = {source: table_name for table_name, sources in TABLE_SOURCES.items() for source in sources}
+
+
+class S3RangeFile(io.RawIOBase):
+    """Seekable, read-only view of an S3 object that fetches fixed-size blocks with ranged GETs as they are read."""
+
+    def __init__(self, client, bucket, key, size=None, block_size=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size if size is not None else client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.block_size = block_size or PREFLIGHT_BLOCK_KB * 1024
+        self.blocks = {}
+        self.pos = 0
+        self.requests = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        return self.pos
+
+    def _block(self, index):
+        if index not in self.blocks:
+            start = index * self.block_size
+            end = min(start + self.block_size, self.size) - 1
+            body = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")["Body"].read()
+            self.blocks[index] = body
+            self.requests += 1
+            self.bytes_read += len(body)
+        return self.blocks[index]
+
+    def readinto(self, b):
+        n = min(len(b), max(0, self.size - self.pos))
+        done = 0
+        while done < n:
+            index, offset = divmod(self.pos, self.block_size)
+            chunk = self._block(index)[offset:offset + n - done]
+            b[done:done + len(chunk)] = chunk
+            done += len(chunk)
+            self.pos += len(chunk)
+        return done
+
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def _first_sheet_part(z):
+    from xml.etree.ElementTree import fromstring
+
+    sheet = fromstring(z.read("xl/workbook.xml")).find(f"{_NS}sheets/{_NS}sheet")
+    rel_id = sheet.get(f"{_REL_NS}id")
+    for rel in fromstring(z.read("xl/_rels/workbook.xml.rels")):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise ValueError("first sheet not found in xl/workbook.xml")
+
+
+def _column_index(ref):
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+
+def _shared_strings(z, needed):
+    from xml.etree.ElementTree import iterparse
+
+    if not needed or "xl/sharedStrings.xml" not in z.namelist():
+        return {}
+    found, last = {}, max(needed)
+    with z.open("xl/sharedStrings.xml") as f:
+        i = 0
+        for _, el in iterparse(f):
+            if el.tag != f"{_NS}si":
+                continue
+            if i in needed:
+                found[i] = "".join(t.text or "" for t in el.iter(f"{_NS}t"))
+            el.clear()
+            if i == last:
+                break
+            i += 1
+    return found
+
+
+def _first_rows(fileobj, rows):
+    """
+    The first rows of an .xlsx workbook's first sheet, streamed straight from
+    the sheet XML. openpyxl's read-only mode scans the whole sheet for its
+    dimensions when the workbook does not record them, which would read
+    every block. Numbers and dates come back as their raw cell text.
+    """
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+
+    with zipfile.ZipFile(fileobj) as z:
+        out, shared = [], set()
+        with z.open(_first_sheet_part(z)) as f:
+            for _, el in iterparse(f):
+                if el.tag != f"{_NS}row":
+                    continue
+                number = int(el.get("r", len(out) + 1))
+                if number > rows:
+                    break
+                out.extend([] for _ in range(number - 1 - len(out)))
+                values = []
+                for c in el.iter(f"{_NS}c"):
+                    col = _column_index(c.get("r")) if c.get("r") else len(values)
+                    values.extend([None] * (col - len(values)))
+                    kind, v = c.get("t"), c.find(f"{_NS}v")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(f"{_NS}t"))
+                    elif v is None or v.text is None:
+                        value = None
+                    elif kind == "s":
+                        value = ("shared", int(v.text))
+                        shared.add(int(v.text))
+                    else:
+                        value = v.text
+                    values.append(value)
+                out.append(values)
+                el.clear()
+        strings = _shared_strings(z, shared)
+    return [
+        [strings.get(v[1]) if isinstance(v, tuple) else (v if v != "" else None) for v in row]
+        for row in out
+    ]
+
+
+def schedule_problems(rows):
+    for row in rows:
+        first = str(row[0]).replace("\xa0", " ").strip() if row and row[0] is not None else None
+        if first == "Name" and any(c < len(row) and row[c] is not None for c in SCHEDULE_DATE_COLS):
+            return []
+    return [f"no week header row ('Name' with shift dates) in the first {len(rows)} rows"]
+
+
+def check_source(name, rows, check=None):
+    """Header problems for the first rows of source family name's workbook."""
+    table_name = _FAMILY_TABLES[name]
+    if table_name not in HEADER_LAYOUTS:
+        return schedule_problems(rows), None
+    header_row, _ = HEADER_LAYOUTS[table_name]
+    header = source_header(table_name, rows[header_row - 1]) if len(rows) >= header_row else []
+    return header_problems(table_name, header, check or SCHEMA_HEADER_CHECK), header
+
+
+def _rows_needed(name):
+    layout = HEADER_LAYOUTS.get(_FAMILY_TABLES[name])
+    return layout[0] if layout else PREFLIGHT_SCAN_ROWS
+
+
+def preflight(client, bucket, objects, check=None):
+    """
+    Validate {name: s3 object} against the declared schemas from ranged reads
+    of each workbook. Raises ValueError listing every problem, including
+    files of one table whose headers disagree. .xls workbooks need the whole
+    file to read any rows and are left to the parser.
+    """
+    check = check or SCHEMA_HEADER_CHECK
+    if check == "off":
+        return {}
+    if check not in ("width", "names"):
+        raise ValueError(f"Unknown SCHEMA_HEADER_CHECK: {check}")
+
+    def _one(name):
+        obj = objects[name]
+        if obj["Key"].lower().endswith(".xls"):
+            return name, None, [], None
+        f = S3RangeFile(client, bucket, obj["Key"], size=obj.get("Size"))
+        try:
+            rows = _first_rows(f, _rows_needed(name))
+        except Exception as e:
+            return name, None, [f"unreadable workbook: {e}"], f
+        problems, header = check_source(name, rows, check)
+        return name, header, problems, f
+
+    with ThreadPoolExecutor(max_workers=max(1, len(objects))) as pool:
+        results = list(pool.map(telemetry.bind(_one), objects))
+
+    problems, headers, skipped = [], {}, []
+    requests = bytes_read = 0
+    for name, header, found, f in results:
+        if f is None and not found:
+            skipped.append(name)
+        if f is not None:
+            requests += f.requests
+            bytes_read += f.bytes_read
+        problems.extend(f"{objects[name]['Key']}: {p}" for p in found)
+        if header is not None:
+            headers[name] = header
+    for sources in TABLE_SOURCES.values():
+        seen = [s for s in sources if s in headers]
+        for s in seen[1:]:
+            if headers[s] != headers[seen[0]]:
+                problems.append(f"{objects[s]['Key']}: header differs from {objects[seen[0]]['Key']}")
+
+    telemetry.count("preflight_requests", requests)
+    telemetry.count("preflight_bytes", bytes_read)
+    print(json.dumps({
+        "msg": "preflight",
+        "check": check,
+        "files": len(objects),
+        "skipped_xls": skipped,
+        "range_requests": requests,
+        "bytes_read": bytes_read,
+        "problems": problems,
+    }))
+    if problems:
+        raise ValueError("Source schema check failed: " + "; ".join(problems))
+    return headers
@@ -0,0 +1,137 @@
+import re
+
+# Declared schema per target table, in INSERT column order:
+# (column, Postgres type, source header label). The loaders' column lists are
+# built from these, and the preflight checks source headers against them.
+# Labels match the bench workbooks (bench/synthetic.py) and have not yet been
+# checked against real Paylocity exports; schedules have no header row.
+PROV_SCHEMA = [
+    ("ee_id", "text", "EE ID"),
+    ("employee_name", "text", "Employee Name"),
+    ("shift_date", "date", "Date"),
+    ("day", "text", "Day"),
+    ("pay_type", "text", "Pay Type"),
+    ("reg_hours", "numeric", "Reg Hours"),
+    ("ot1_hours", "numeric", "OT1 Hours"),
+    ("ot2_hours", "numeric", "OT2 Hours"),
+    ("unpaid_hours", "numeric", "Unpaid Hours"),
+    ("time_in", "text", "Time In"),
+    ("time_out", "text", "Time Out"),
+    ("cc1", "text", "CC1"),
+    ("cc2", "text", "CC2"),
+    ("reg_charge_rate", "numeric", "Reg Charge Rate"),
+    ("ot_charge_rate", "numeric", "OT Charge Rate"),
+    ("reg_charge_amount", "numeric", "Reg Charge Amount"),
+    ("ot_charge_amount", "numeric", "OT Charge Amount"),
+    ("total_charge_amount", "numeric", "Total Charge Amount"),
+    ("reg_pay_rate", "numeric", "Reg Pay Rate"),
+    ("ot_pay_rate", "numeric", "OT Pay Rate"),
+    ("reg_paid", "numeric", "Reg Paid"),
+    ("ot_paid", "numeric", "OT Paid"),
+    ("total_pay_amount", "numeric", "Total Pay Amount"),
+]
+
+LABOR_SCHEMA = [
+    ("company", "text", "Company"),
+    ("ee_id", "text", "EE ID"),
+    ("cntlast", "text", "Last"),
+    ("cntfirst", "text", "First"),
+    ("cntdept", "text", "Dept"),
+    ("cndarea", "text", "Area"),
+    ("last_check_dt", "date", "Last Check Date"),
+    ("cc1", "text", "CC1"),
+    ("cc2", "text", "CC2"),
+    ("reg_hours", "numeric", "Reg Hours"),
+    ("reg_amount", "numeric", "Reg Amount"),
+    ("ot_hours", "numeric", "OT Hours"),
+    ("ot_amount", "numeric", "OT Amount"),
+    ("bonus_amount", "numeric", "Bonus Amount"),
+    ("other_amount", "numeric", "Other Amount"),
+    ("suta", "numeric", "SUTA"),
+    ("futa", "numeric", "FUTA"),
+    ("ss_tax", "numeric", "SS Tax"),
+    ("mcare_tax", "numeric", "Medicare Tax"),
+    ("other_tax", "numeric", "Other Tax"),
+    ("ret_ben", "numeric", "Retirement"),
+    ("med_ben", "numeric", "Medical"),
+    ("dent_ben", "numeric", "Dental"),
+    ("vis_ben", "numeric", "Vision"),
+    ("oth_ben", "numeric", "Other Benefit"),
+]
+
+SCHEDULE_SCHEMA = [
+    ("cc1", "text", None),
+    ("employee_name", "text", None),
+    ("employee_number", "text", None),
+    ("shift_date", "date", None),
+    ("shift_day", "text", None),
+    ("shift", "text", None),
+    ("shift_hours", "numeric", None),
+    ("manual_attendance", "boolean", None),
+    ("manual_attendance_points", "text", None),
+]
+
+TABLE_SCHEMAS = {
+    "app.clinic_ccprov": PROV_SCHEMA,
+    "app.clinic_ccstaff": PROV_SCHEMA,
+    "app.clinic_labor_costs": LABOR_SCHEMA,
+    "app.clinic_ccschedule": SCHEDULE_SCHEMA,
+}
+
+# Where each table's source exports carry their column header: (1-indexed
+# header row, source column positions the cleaner drops). ccprov/ccstaff
+# exports have 5 report rows above the header and a Department column C.
+HEADER_LAYOUTS = {
+    "app.clinic_ccprov": (6, (2,)),
+    "app.clinic_ccstaff": (6, (2,)),
+    "app.clinic_labor_costs": (1, ()),
+}
+
+# Schedule exports repeat a "Name" header row per week with the shift dates
+# in these columns.
+SCHEDULE_DATE_COLS = [4, 6, 8, 11, 14, 15, 17]  # E, G, I, L, O, P, R
+
+
+def column_names(table_name):
+    return [column for column, _, _ in TABLE_SCHEMAS[table_name]]
+
+
+def column_types(table_name):
+    return {column: pg_type for column, pg_type, _ in TABLE_SCHEMAS[table_name]}
+
+
+def _label_key(label):
+    # Case, spacing and punctuation differences between exports are not drift.
+    return re.sub(r"[^a-z0-9]", "", str(label).lower())
+
+
+def source_header(table_name, row):
+    """The header cells of a source row that map onto table columns, trailing blanks dropped."""
+    _, dropped = HEADER_LAYOUTS[table_name]
+    header = [v for i, v in enumerate(row) if i not in dropped]
+    while header and (header[-1] is None or str(header[-1]).strip() == ""):
+        header.pop()
+    return header
+
+
+def header_problems(table_name, header, check="width"):
+    """
+    Problems with a source header against the table's schema, as messages.
+    check="width" requires one non-blank label per column; "names" also
+    requires the declared labels in order.
+    """
+    schema = TABLE_SCHEMAS[table_name]
+    if not header:
+        return ["no header row"]
+    problems = []
+    if len(header) != len(schema):
+        problems.append(f"{len(header)} columns, expected {len(schema)}")
+    blank = [i + 1 for i, v in enumerate(header) if v is None or str(v).strip() == ""]
+    if blank:
+        problems.append(f"blank header labels at positions {blank}")
+    if check == "names":
+        for i, ((column, _, label), actual) in enumerate(zip(schema, header), start=1):
+            if _label_key(label) != _label_key(actual):
+                problems.append(f"column {i} is {actual!r}, expected {label!r} ({column})")
+                break
+    return problems
@@ -0,0 +1,142 @@
+import contextvars
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Spans and counters collected during one invocation and printed as CloudWatch
+# Embedded Metric Format, so CloudWatch Logs turns them into metrics directly.
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "PaylocityLaborCosts")
+TELEMETRY_ENABLED = os.getenv("TELEMETRY", "true").lower() in ("1", "true", "yes")
+# tracemalloc gives per-span Python heap peaks but slows parsing noticeably.
+TELEMETRY_TRACEMALLOC = os.getenv("TELEMETRY_TRACEMALLOC", "false").lower() in ("1", "true", "yes")
+
+# Path of the spans open in the current context. Pool threads start with an
+# empty context, so work handed to them goes through bind() to nest under the
+# span that submitted it.
+_path = contextvars.ContextVar("telemetry_path", default=())
+_lock = threading.Lock()
+_spans = []
+_counters = defaultdict(float)
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def reset():
+    """Start a new invocation: drop collected spans and counters."""
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+    if TELEMETRY_TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+@contextmanager
+def span(name, **fields):
+    """
+    Time a stage. Nested spans are recorded as "parent/child", including spans
+    opened by pool work wrapped with bind(). The yielded dict can be filled
+    with extra numeric fields, e.g. s["rows"] = n; those become metrics
+    alongside the duration.
+    """
+    path = _path.get() + (name,)
+    token = _path.set(path)
+    record = dict(fields)
+    if TELEMETRY_TRACEMALLOC and tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record["peak_rss_mb"] = peak_rss_mb()
+        if TELEMETRY_TRACEMALLOC and tracemalloc.is_tracing():
+            record["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        record["span"] = "/".join(path)
+        _path.reset(token)
+        with _lock:
+            _spans.append(record)
+
+def bind(fn):
+    """
+    fn wrapped to run under the spans open where bind() is called, for work
+    handed to a thread pool. Each call gets its own copy of that context, so
+    concurrent calls do not share one.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+def count(name, value=1):
+    """Add to an invocation-wide counter such as rows_processed or db_round_trips."""
+    with _lock:
+        _counters[name] += value
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+_UNITS = {
+    "duration_ms": "Milliseconds",
+    "peak_rss_mb": "Megabytes",
+    "traced_peak_mb": "Megabytes",
+    "bytes": "Bytes",
+    "bytes_downloaded": "Bytes",
+}
+
+def _emf(dimensions, values):
+    metrics = [
+        {"Name": name, "Unit": _UNITS.get(name, "Count")}
+        for name, value in values.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+    doc = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": metrics,
+            }],
+        },
+    }
+    doc.update(dimensions)
+    doc.update(values)
+    return doc
+
+_MAX_FIELDS = ("peak_rss_mb", "traced_peak_mb")
+
+def _aggregate(spans):
+    # Spans repeated under the same path (e.g. per chunk) are summed into one
+    # entry; memory peaks take the maximum.
+    merged = {}
+    for record in spans:
+        agg = merged.setdefault(record["span"], {"calls": 0})
+        agg["calls"] += 1
+        for k, v in record.items():
+            if k == "span" or not isinstance(v, (int, float)) or isinstance(v, bool):
+                continue
+            if k in _MAX_FIELDS:
+                agg[k] = max(agg.get(k, v), v)
+            else:
+                agg[k] = agg.get(k, 0) + v
+    return merged
+
+def emit(**dimensions):
+    """Print one EMF document per span path (dimension Stage) and one with the run totals."""
+    if not TELEMETRY_ENABLED:
+        return
+    with _lock:
+        spans = list(_spans)
+        totals = dict(_counters)
+    for path, values in _aggregate(spans).items():
+        print(json.dumps(_emf({**dimensions, "Stage": path}, values), default=str))
+    totals["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(_emf({**dimensions, "Stage": "total"}, totals), default=str))
@@ -0,0 +1,117 @@
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+# "auto" uses python-calamine when it is installed and the openpyxl/xlrd path
+# otherwise; "calamine" requires it; "openpyxl" always uses openpyxl (.xlsx)
+# or xlrd (.xls).
+READER_BACKEND = os.getenv("XLSX_READER_BACKEND", "auto")
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+
+def resolve_backend(backend=None):
+    backend = backend or READER_BACKEND
+    if backend == "auto":
+        return "calamine" if CalamineWorkbook is not None else "openpyxl"
+    if backend == "calamine" and CalamineWorkbook is None:
+        raise ImportError("XLSX_READER_BACKEND=calamine requires the 'python-calamine' package.")
+    if backend not in ("calamine", "openpyxl"):
+        raise ValueError(f"Unknown XLSX_READER_BACKEND: {backend}")
+    return backend
+
+
+def _normalize_calamine(v):
+    # Match openpyxl's values: blanks are None, whole numbers are int, dates are datetime.
+    if isinstance(v, str):
+        return v if v != "" else None
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if type(v) is date:
+        return datetime(v.year, v.month, v.day)
+    return v
+
+
+def _iter_calamine(path, min_row):
+    sheet = CalamineWorkbook.from_path(str(path)).get_sheet_by_index(0)
+    for i, row in enumerate(sheet.iter_rows(), start=1):
+        if i < min_row:
+            continue
+        yield tuple(_normalize_calamine(v) for v in row)
+
+
+def _iter_openpyxl(path, min_row):
+    from openpyxl import load_workbook
+
+    # data_only=True uses computed values for formulas (if saved)
+    wb = load_workbook(path, data_only=True, read_only=True)
+    try:
+        yield from wb.active.iter_rows(min_row=min_row, values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_xlrd(path, min_row):
+    try:
+        import xlrd
+    except ImportError as exc:
+        raise ImportError(
+            "Reading .xls files requires the 'xlrd' package in your Lambda deployment package or layer."
+        ) from exc
+
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for r in range(min_row - 1, sheet.nrows):
+            row = []
+            for cell in sheet.row(r):
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    row.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_NUMBER and float(cell.value).is_integer():
+                    row.append(int(cell.value))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                else:
+                    row.append(cell.value)
+            yield tuple(row)
+    finally:
+        book.release_resources()
+
+
+def iter_rows(path, min_row=1, backend=None):
+    """Yield the first sheet's rows as tuples of values, starting at 1-indexed min_row."""
+    if resolve_backend(backend) == "calamine":
+        return _iter_calamine(path, min_row)
+    if Path(path).suffix.lower() == ".xls":
+        return _iter_xlrd(path, min_row)
+    return _iter_openpyxl(path, min_row)
+
+
+def read_frame(path, backend=None):
+    """The first sheet as a header-less object DataFrame, as pd.read_excel(header=None) gives."""
+    import pandas as pd
+
+    backend = resolve_backend(backend)
+    if backend == "calamine":
+        return pd.DataFrame(list(iter_rows(path, backend=backend)))
+
+    suffix = Path(path).suffix.lower()
+    engine = None
+    if suffix == ".xlsx":
+        engine = "openpyxl"
+    elif suffix == ".xls":
+        engine = "xlrd"
+
+    try:
+        return pd.read_excel(path, sheet_name=0, header=None, engine=engine)
+    except ImportError as exc:
+        if suffix == ".xls":
+            raise ImportError(
+                "Reading .xls files requires the 'xlrd' package in your Lambda deployment package or layer."
+            ) from exc
+        raise
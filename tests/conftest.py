@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The Lambda modules are flat files in src/, imported by bare name.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+@pytest.fixture
+def pg_conn():
+    """
+    A connection to a scratch Postgres database named by TEST_DB_CREDENTIALS
+    (same JSON shape as DB_CREDENTIALS); tests using it are skipped without
+    one. Whatever the test leaves uncommitted is rolled back.
+    """
+    credentials = os.getenv("TEST_DB_CREDENTIALS")
+    if not credentials:
+        pytest.skip("TEST_DB_CREDENTIALS not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    creds = json.loads(credentials)
+    conn = psycopg2.connect(
+        host=creds["host"],
+        port=creds.get("port", 5432),
+        dbname=creds["database"],
+        user=creds["user"],
+        password=creds.get("password", ""),
+    )
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,111 @@
+from datetime import date
+
+import pytest
+from openpyxl import Workbook
+
+import pay_ccprov_upload
+from pay_ccschedule_clean import iter_schedule_rows
+from pay_schemas import SCHEDULE_DATE_COLS
+
+TABLE = "pytest_paylocity.sched"
+COLUMNS = ["cc1", "shift_date", "shift_hours"]
+
+
+@pytest.fixture
+def cursor(pg_conn):
+    cursor = pg_conn.cursor()
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS pytest_paylocity")
+    yield cursor
+    pg_conn.rollback()
+    cursor.execute("DROP SCHEMA IF EXISTS pytest_paylocity CASCADE")
+    pg_conn.commit()
+
+
+def _create_partitioned(cursor):
+    cursor.execute(f"CREATE TABLE {TABLE} (cc1 text, shift_date date, shift_hours numeric) PARTITION BY RANGE (shift_date)")
+
+
+def _rows(cursor):
+    cursor.execute(f"SELECT cc1, shift_date, shift_hours FROM {TABLE} ORDER BY shift_date NULLS FIRST, cc1")
+    return [(cc1, day, float(hours)) for cc1, day, hours in cursor.fetchall()]
+
+
+def test_partition_load_keeps_rows_outside_incoming_span(cursor, monkeypatch):
+    monkeypatch.setitem(pay_ccprov_upload.PARTITION_COLUMNS, TABLE, "shift_date")
+    monkeypatch.setattr(pay_ccprov_upload, "PARTITION_GRAIN", "month")
+    _create_partitioned(cursor)
+
+    first = [
+        ("A", "2025-01-03", 8), ("A", "2025-01-20", 8), ("A", "2025-02-10", 8), (None, None, 1),
+    ]
+    second = [("B", "2025-01-15", 6), ("B", "2025-01-25", 6)]
+    pay_ccprov_upload._partition_rows(cursor, TABLE, COLUMNS, first)
+    count, dates = pay_ccprov_upload._partition_rows(cursor, TABLE, COLUMNS, second)
+
+    assert count == 2
+    assert dates == ("2025-01-15", "2025-01-25")
+    # The first file's 2025-01-20 row falls inside the second file's span and
+    # is replaced; its other rows, undated one included, survive.
+    assert _rows(cursor) == [
+        (None, None, 1.0),
+        ("A", date(2025, 1, 3), 8.0),
+        ("B", date(2025, 1, 15), 6.0),
+        ("B", date(2025, 1, 25), 6.0),
+        ("A", date(2025, 2, 10), 8.0),
+    ]
+
+
+def _write_schedule(path, first_day, shift):
+    """One clinic, one week, one employee working shift every day."""
+    wb = Workbook()
+    ws = wb.active
+    width = max(SCHEDULE_DATE_COLS) + 1
+    ws.append(["URGENT CARE NORTH"] + [None] * (width - 1))
+    header = ["Name", "Employee #"] + [None] * (width - 2)
+    for i, col in enumerate(SCHEDULE_DATE_COLS):
+        header[col] = f"1/{first_day + i}/2025"
+    ws.append(header)
+    employee = ["Jane Doe", 101] + [None] * (width - 2)
+    for col in SCHEDULE_DATE_COLS:
+        employee[col] = shift
+    ws.append(employee)
+    ws.append(["Totals:"])
+    wb.save(path)
+    return str(path)
+
+
+def test_stream_truncate_keeps_table_when_a_workbook_fails(cursor, tmp_path):
+    conn = cursor.connection
+    cursor.execute(f"""CREATE TABLE {TABLE} (
+        cc1 text, employee_name text, employee_number text, shift_date date, shift_day text,
+        shift text, shift_hours numeric, manual_attendance boolean, manual_attendance_points text
+    )""")
+    conn.commit()
+    columns = pay_ccprov_upload.SCHEDULE_COLUMNS
+
+    first = _write_schedule(tmp_path / "first.xlsx", 5, "8:00 AM - 4:00 PM")
+    pay_ccprov_upload._load_truncate(conn, cursor, [(TABLE, columns, iter_schedule_rows([first]))], {})
+    before = _rows(cursor)
+    assert len(before) == 7
+
+    second = _write_schedule(tmp_path / "second.xlsx", 12, "9:00 AM - 5:00 PM")
+    bad = tmp_path / "bad.xlsx"
+    bad.write_bytes(b"not a workbook")
+    with pytest.raises(Exception):
+        pay_ccprov_upload._load_truncate(
+            conn, cursor, [(TABLE, columns, iter_schedule_rows([second, str(bad)]))], {}
+        )
+    assert _rows(cursor) == before
+
+
+def test_diff_pairs_unchanged_duplicate_key_rows(cursor):
+    cursor.execute(f"CREATE TABLE {TABLE} (k int, v text)")
+    # Row hashes sort x0 < x1 < x2: pairing the key's rows purely in hash
+    # order would match live x1 with staged x0 and live x2 with staged x1.
+    cursor.execute(f"INSERT INTO {TABLE} VALUES (1, 'x1'), (1, 'x2'), (2, 'y')")
+    staging, _ = pay_ccprov_upload._stage_rows(cursor, TABLE, ["k", "v"], [(1, "x0"), (1, "x1"), (2, "y")])
+    changes, _ = pay_ccprov_upload._apply_diff(cursor, TABLE, staging, ["k", "v"], ["k"])
+
+    assert changes == {"deleted": 0, "updated": 1, "inserted": 0}
+    cursor.execute(f"SELECT k, v FROM {TABLE} ORDER BY k, v")
+    assert cursor.fetchall() == [(1, "x0"), (1, "x1"), (2, "y")]
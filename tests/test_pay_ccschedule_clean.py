@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pay_ccschedule_clean import (
+    _finalize_frame,
+    calculate_shift_hours,
+    calculate_shift_hours_series,
+    clean_cell,
+    iter_row_records,
+    iter_workbook_records,
+    parse_frame,
+)
+from pay_schemas import SCHEDULE_DATE_COLS
+
+
+def test_shift_hours_series_float_with_several_nans():
+    result = calculate_shift_hours_series(pd.Series([np.nan, np.nan, 1.0, np.nan]))
+    assert result.dtype == object
+    assert list(result) == [calculate_shift_hours(v) for v in (None, None, 1.0, None)]
+    assert result[0] is None and result[3] is None
+
+
+def test_shift_hours_series_matches_scalar():
+    values = ["8:00 AM - 4:30 PM", None, np.nan, "OFF", "8:00 AM - 4:30 PM", "", 7, "10:00 PM - 6:00 AM"]
+    result = calculate_shift_hours_series(pd.Series(values, dtype=object))
+    assert list(result) == [calculate_shift_hours(v) for v in values]
+    assert result.index.equals(pd.RangeIndex(len(values)))
+
+
+DAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+
+
+def _row(first=(), cells=None, width=max(SCHEDULE_DATE_COLS) + 1):
+    """A sheet row as read_frame gives it: NaN for blank cells, padded to width."""
+    row = list(first) + [np.nan] * (width - len(first))
+    for col, value in (cells or {}).items():
+        row[col] = value
+    return row
+
+
+def _records(frame):
+    return [tuple(None if pd.isna(v) else v for v in row) for row in frame.itertuples(index=False, name=None)]
+
+
+def _parsed(rows):
+    """Records from the vectorized, row-by-row and streaming parsers, which must agree."""
+    df = pd.DataFrame(rows)
+    vectorized = _records(_finalize_frame(parse_frame(df)))
+    by_row = _records(_finalize_frame(pd.DataFrame(list(iter_workbook_records(df)))))
+    # Readers trim trailing blank cells, so stream rows can be shorter than the sheet.
+    stripped = [[clean_cell(v) for v in row] for row in rows]
+    stripped = [row[:max([i + 1 for i, v in enumerate(row) if v is not None], default=0)] for row in stripped]
+    streamed = _records(_finalize_frame(pd.DataFrame(list(iter_row_records(stripped)))))
+    assert vectorized == by_row == streamed
+    return vectorized
+
+
+def test_parse_mixed_dates_blank_rows_and_manual_attendance():
+    days = dict(zip(SCHEDULE_DATE_COLS, DAYS))
+    rows = [
+        _row(["Detailed Schedules"]),
+        _row(["URGENT CARE NORTH"]),
+        _row(cells=days),
+        _row(["Name", "Employee #"], dict(zip(SCHEDULE_DATE_COLS, [f"1/{d}/2025" for d in range(5, 12)]))),
+        _row(["Jane\xa0Doe ", 101.0], dict(zip(SCHEDULE_DATE_COLS, [
+            "8:00 AM - 4:00 PM", "OFF", "Manual Attendance", np.nan, "7:00 AM - 7:00 PM", "PTO", "10 - 6",
+        ]))),
+        _row(cells={SCHEDULE_DATE_COLS[2]: 1.0}),
+        _row(cells={SCHEDULE_DATE_COLS[2]: "9:00 AM - 5:30 PM"}),
+        _row(),
+        _row(["Totals:"]),
+        _row(),
+        _row(["Wendy"]),
+        _row(cells=days),
+        # Real dates in the second week's header, text dates in the first.
+        _row(["Name", "Employee #"], dict(zip(SCHEDULE_DATE_COLS, [datetime(2025, 1, d) for d in range(12, 19)]))),
+        _row(["John Roe", 102.0], dict(zip(SCHEDULE_DATE_COLS, ["7:00 PM - 7:00 AM"] * 7))),
+    ]
+    clinic = "Urgent Care North"
+    assert _parsed(rows) == [
+        (clinic, "Jane Doe", "101", "2025-01-05", "Sun", "8:00 AM - 4:00 PM", 8.0, False, None),
+        (clinic, "Jane Doe", "101", "2025-01-06", "Mon", "OFF", None, False, None),
+        (clinic, "Jane Doe", "101", "2025-01-07", "Tue", "9:00 AM - 5:30 PM", 8.5, True, "1"),
+        (clinic, "Jane Doe", "101", "2025-01-08", "Wed", None, None, False, None),
+        (clinic, "Jane Doe", "101", "2025-01-09", "Thu", "7:00 AM - 7:00 PM", 12.0, False, None),
+        (clinic, "Jane Doe", "101", "2025-01-10", "Fri", "PTO", None, False, None),
+        (clinic, "Jane Doe", "101", "2025-01-11", "Sat", "10 - 6", 20.0, False, None),
+    ] + [
+        # Real dates used to come out as "2025-01-12 00:00:00"; format='mixed' gives plain dates.
+        (clinic, "John Roe", "102", f"2025-01-{d}", day, "7:00 PM - 7:00 AM", 12.0, False, None)
+        for d, day in zip(range(12, 19), DAYS)
+    ]
+
+
+def test_parse_narrow_sheet():
+    # Date columns past the sheet's last column come out as blank days.
+    width = SCHEDULE_DATE_COLS[2] + 1
+    first = SCHEDULE_DATE_COLS[:3]
+    rows = [
+        _row(["URGENT CARE SOUTH"], width=width),
+        _row(cells=dict(zip(first, DAYS)), width=width),
+        _row(["Name", "Employee #"], dict(zip(first, ["2/2/2025", "2/3/2025", "2/4/2025"])), width=width),
+        _row(["Ann Poe", 7.0], dict(zip(first, ["8:00 AM - 4:00 PM", "OFF", "12:00 PM - 12:00 AM"])), width=width),
+    ]
+    clinic = "Urgent Care South"
+    assert _parsed(rows) == [
+        (clinic, "Ann Poe", "7", "2025-02-02", "Sun", "8:00 AM - 4:00 PM", 8.0, False, None),
+        (clinic, "Ann Poe", "7", "2025-02-03", "Mon", "OFF", None, False, None),
+        (clinic, "Ann Poe", "7", "2025-02-04", "Tue", "12:00 PM - 12:00 AM", 12.0, False, None),
+    ] + [(clinic, "Ann Poe", "7", None, None, None, None, False, None)] * 4
+
+
+def test_parse_single_column_sheet():
+    # An employee-looking row with no second column used to raise IndexError.
+    rows = [_row(["URGENT CARE WEST"], width=1), _row(["Name"], width=1), _row(["Employee"], width=1)]
+    assert _parsed(rows) == []